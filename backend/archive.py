@@ -0,0 +1,325 @@
+"""
+Cold-data archival tier.
+
+Expenses older than the archive horizon are moved out of the live expense
+store into db.expense_archive, one zlib-compressed document per user and
+month. Each archived month leaves a small pre-aggregated summary behind
+in db.expense_month_summaries, so full-history totals never have to
+decompress anything.
+
+db.archive_state records, per user, the date before which expenses may be
+archived (the watermark). ArchivingExpenseStore wraps the live store with
+the same interface and only reads the archive when a requested range
+starts before the watermark. Editing or deleting an archived expense
+takes it back out of the archive. Each archived month carries a `rev`
+counter, and rewrites of a month only apply while it is still at the
+revision read, so concurrent rewrites retry instead of undoing each other.
+"""
+import json
+import zlib
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from storage import category_totals, matches_filters
+
+
+def compress_rows(rows: List[dict]) -> bytes:
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode(), 9)
+
+
+def decompress_rows(payload: bytes) -> List[dict]:
+    return json.loads(zlib.decompress(payload))
+
+
+def merge_rows(primary: List[dict], secondary: List[dict]) -> List[dict]:
+    """Union by id, keeping the `primary` copy when a row is in both."""
+    seen = {exp["id"] for exp in primary}
+    return primary + [exp for exp in secondary if exp["id"] not in seen]
+
+
+class ArchivingExpenseStore:
+    def __init__(self, live, db):
+        self.live = live
+        self.archive = db.expense_archive
+        self.summaries = db.expense_month_summaries
+        self.state = db.archive_state
+
+    async def create_indexes(self):
+        await self.live.create_indexes()
+        await self.archive.create_index([("user_id", 1), ("month", -1)], unique=True)
+        await self.archive.create_index([("user_id", 1), ("ids", 1)])
+        await self.archive.create_index([("user_id", 1), ("max_version", 1)])
+        await self.summaries.create_index([("user_id", 1), ("month", 1)], unique=True)
+        await self.state.create_index("user_id", unique=True)
+
+    async def _watermark(self, user_id: str) -> Optional[str]:
+        state = await self.state.find_one({"user_id": user_id}, {"_id": 0, "archived_before": 1})
+        return state["archived_before"] if state else None
+
+    async def _archived_rows(self, user_id: str, query: dict, row_filter=None, descending: bool = True,
+                             limit: Optional[int] = None) -> List[dict]:
+        cursor = self.archive.find(
+            {"user_id": user_id, **query},
+            {"_id": 0, "payload": 1}
+        ).sort("month", -1 if descending else 1)
+
+        rows = []
+        async for doc in cursor:
+            matched = [exp for exp in decompress_rows(doc["payload"]) if not row_filter or row_filter(exp)]
+            matched.sort(key=lambda exp: exp["date"], reverse=descending)
+            rows.extend(matched)
+            if limit and len(rows) >= limit:
+                break
+        return rows
+
+    async def _write_month(self, user_id: str, month: str, rows: List[dict], rev: Optional[int]) -> bool:
+        """
+        Replace one archived month and its summary with `rows`, provided the
+        month is still at revision `rev` (None when it was not archived
+        yet). Returns False when another writer changed it first. An
+        emptied month keeps its document so the revision keeps counting.
+        """
+        new_rev = (rev or 0) + 1
+        try:
+            await self.archive.update_one(
+                {"user_id": user_id, "month": month, "rev": rev},
+                {"$set": {
+                    "payload": compress_rows(rows),
+                    "ids": [exp["id"] for exp in rows],
+                    "count": len(rows),
+                    "max_version": max((exp.get("version", 0) for exp in rows), default=0),
+                    "rev": new_rev
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        try:
+            await self.summaries.update_one(
+                {"user_id": user_id, "month": month, "rev": {"$not": {"$gte": new_rev}}},
+                {"$set": {
+                    "count": len(rows),
+                    "total": sum(exp["amount"] for exp in rows),
+                    "categories": [
+                        {"category": category, "total": amount, "count": count}
+                        for category, (amount, count) in category_totals(rows).items()
+                    ],
+                    "rev": new_rev
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # A later revision's summary is already in place
+        return True
+
+    async def _modify_month(self, user_id: str, month: str, modify) -> List[dict]:
+        """
+        Replace the rows of an archived month with `modify(rows)`, re-reading
+        and retrying when a concurrent writer changed the month in between.
+        Returns the rows the change was applied to.
+        """
+        while True:
+            doc = await self.archive.find_one({"user_id": user_id, "month": month}, {"_id": 0, "payload": 1, "rev": 1})
+            rows = decompress_rows(doc["payload"]) if doc else []
+            modified = modify(rows)
+            if modified == rows or await self._write_month(user_id, month, modified, doc and doc.get("rev")):
+                return rows
+
+    async def _archived(self, user_id: str, expense_id: str) -> Optional[dict]:
+        doc = await self.archive.find_one({"user_id": user_id, "ids": expense_id}, {"_id": 0, "payload": 1})
+        if not doc:
+            return None
+        return next(exp for exp in decompress_rows(doc["payload"]) if exp["id"] == expense_id)
+
+    async def _take(self, user_id: str, expense_id: str) -> Optional[dict]:
+        """Remove one expense from the archive and return it; None if it is not (or no longer) there."""
+        doc = await self.archive.find_one({"user_id": user_id, "ids": expense_id}, {"_id": 0, "month": 1})
+        if not doc:
+            return None
+        rows = await self._modify_month(
+            user_id, doc["month"], lambda rows: [exp for exp in rows if exp["id"] != expense_id]
+        )
+        return next((exp for exp in rows if exp["id"] == expense_id), None)
+
+    async def archive_user(self, user_id: str, cutoff: str) -> int:
+        """
+        Move the user's expenses dated before `cutoff` (a YYYY-MM-01 date)
+        into the archive. The watermark is advanced before the live rows are
+        deleted, so readers never miss a row; row reads de-duplicate by id
+        while a row briefly exists in both tiers. Safe to re-run after a crash.
+
+        Live rows are only deleted if they are still at the version read
+        here. A row edited or deleted meanwhile stays as the API left it and
+        its stale copy is dropped from the archive again.
+        """
+        rows = await self.live.find(user_id, end_date=cutoff, end_exclusive=True, descending=False)
+        if not rows:
+            return 0
+
+        months = {}
+        for exp in rows:
+            months.setdefault(exp["date"][:7], []).append(exp)
+        for month, month_rows in months.items():
+            await self._modify_month(user_id, month, lambda archived: merge_rows(month_rows, archived))
+
+        await self.state.update_one(
+            {"user_id": user_id},
+            {"$max": {"archived_before": cutoff}},
+            upsert=True
+        )
+        deleted = {exp["id"] for exp in await self.live.delete_many(user_id, rows)}
+
+        changed = {}
+        for exp in rows:
+            if exp["id"] not in deleted:
+                changed.setdefault(exp["date"][:7], set()).add(exp["id"])
+        for month, ids in changed.items():
+            await self._modify_month(user_id, month, lambda archived: [exp for exp in archived if exp["id"] not in ids])
+        return len(deleted)
+
+    async def rewrite_archived(self, user_id: str, transform) -> int:
+        """
+        Replace every archived row of the user with `transform(row)`;
+        returns the number changed. `transform` may see a row more than
+        once when a concurrent write makes a month retry.
+        """
+        changed = 0
+        for month in await self.archive.distinct("month", {"user_id": user_id}):
+            counted = []
+
+            def modify(rows: List[dict]) -> List[dict]:
+                rewritten = [transform(exp) for exp in rows]
+                # Only the attempt that gets written counts
+                counted[:] = [sum(1 for old, new in zip(rows, rewritten) if old != new)]
+                return rewritten
+
+            await self._modify_month(user_id, month, modify)
+            changed += counted[0]
+        return changed
+
+    async def user_ids(self) -> List[str]:
+        return await self.live.user_ids()
+
+    async def insert(self, expense: dict):
+        await self.live.insert(expense)
+
+    async def insert_many(self, expenses: List[dict]):
+        await self.live.insert_many(expenses)
+
+    async def find(self, user_id: str, category_id: Optional[int] = None, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, end_exclusive: bool = False,
+                   descending: bool = True, limit: Optional[int] = None) -> List[dict]:
+        rows = await self.live.find(user_id, category_id, start_date, end_date, end_exclusive, descending, limit)
+
+        watermark = await self._watermark(user_id)
+        if not watermark or (start_date and start_date >= watermark):
+            return rows
+        # Newest-first with a full page of rows that are all newer than
+        # anything archived: the archive cannot contribute
+        if descending and limit and len(rows) >= limit and rows[-1]["date"] >= watermark:
+            return rows
+
+        query = {}
+        if start_date:
+            query.setdefault("month", {})["$gte"] = start_date[:7]
+        if end_date:
+            query.setdefault("month", {})["$lte"] = end_date[:7]
+
+        def row_filter(exp: dict) -> bool:
+            return matches_filters(exp, category_id, start_date, end_date, end_exclusive)
+
+        archived = await self._archived_rows(user_id, query, row_filter, descending, limit)
+        merged = merge_rows(rows, archived)
+        merged.sort(key=lambda exp: exp["date"], reverse=descending)
+        return merged[:limit] if limit else merged
+
+    async def get(self, user_id: str, expense_id: str) -> Optional[dict]:
+        expense = await self.live.get(user_id, expense_id)
+        if expense:
+            return expense
+        return await self._archived(user_id, expense_id)
+
+    async def update(self, user_id: str, expense_id: str, changes: dict) -> Optional[dict]:
+        previous = await self.live.update(user_id, expense_id, changes)
+        if previous:
+            return previous
+        previous = await self._archived(user_id, expense_id)
+        if not previous:
+            return None
+        # The edited row goes to live before it leaves the archive, so a
+        # failure in between never loses it; reads already prefer the live copy
+        updated = {**previous, **changes}
+        try:
+            await self.live.insert(updated)
+        except DuplicateKeyError:
+            # A concurrent edit already moved it back
+            return await self.live.update(user_id, expense_id, changes)
+        if await self._take(user_id, expense_id) is None:
+            # Same, in a layout that cannot refuse a second copy: drop ours
+            await self.live.delete_many(user_id, [updated])
+            return await self.live.update(user_id, expense_id, changes)
+        return previous
+
+    async def delete(self, user_id: str, expense_id: str) -> Optional[dict]:
+        deleted = await self.live.delete(user_id, expense_id)
+        if deleted:
+            return deleted
+        return await self._take(user_id, expense_id)
+
+    async def delete_many(self, user_id: str, expenses: List[dict]) -> List[dict]:
+        return await self.live.delete_many(user_id, expenses)
+
+    async def changed_since(self, user_id: str, version: int) -> List[dict]:
+        rows = await self.live.changed_since(user_id, version)
+        if not await self._watermark(user_id):
+            return rows
+        if not version:
+            return merge_rows(rows, await self._archived_rows(user_id, {}))
+        archived = await self._archived_rows(
+            user_id,
+            {"max_version": {"$gt": version}},
+            lambda exp: exp.get("version", 0) > version
+        )
+        return merge_rows(rows, archived)
+
+    async def _summary_totals(self, user_id: str) -> List[dict]:
+        summaries = await self.summaries.find(
+            {"user_id": user_id},
+            {"_id": 0, "month": 1, "categories": 1}
+        ).to_list(None)
+        return [
+            {"month": summary["month"], **cat}
+            for summary in summaries
+            for cat in summary["categories"]
+        ]
+
+    async def monthly_category_totals(self, user_id: str) -> List[dict]:
+        # A month can have rows in both tiers, e.g. an archived expense that
+        # was edited and so moved back to the live store
+        totals = {}
+        for row in await self.live.monthly_category_totals(user_id) + await self._summary_totals(user_id):
+            entry = totals.setdefault((row["month"], row["category"]), [0, 0])
+            entry[0] += row["total"]
+            entry[1] += row["count"]
+        return [
+            {"month": month, "category": category, "total": total, "count": count}
+            for (month, category), (total, count) in totals.items()
+        ]
+
+    async def dashboard_facets(self, user_id: str, recent: int, month_start: str, next_month_start: str) -> dict:
+        facets = await self.live.dashboard_facets(user_id, recent, month_start, next_month_start)
+
+        monthly = {row["_id"]: row for row in facets["monthly"]}
+        for row in await self._summary_totals(user_id):
+            month = monthly.setdefault(row["month"], {"_id": row["month"], "amount": 0})
+            month["amount"] += row["total"]
+
+        if len(facets["recent"]) < recent:
+            archived = await self._archived_rows(user_id, {}, limit=recent)
+            merged = merge_rows(facets["recent"], archived)
+            merged.sort(key=lambda exp: exp["date"], reverse=True)
+            facets["recent"] = merged[:recent]
+
+        facets["monthly"] = list(monthly.values())
+        return facets
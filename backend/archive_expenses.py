@@ -0,0 +1,75 @@
+"""
+Move expenses older than the archive horizon into the archive tier.
+
+Meant to run periodically (e.g. nightly from cron). Each run archives, per
+user, every expense dated before the first day of the month that lies
+ARCHIVE_HORIZON_MONTHS months back, leaving monthly summaries behind.
+
+    python archive_expenses.py --horizon-months 24
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from archive import ArchivingExpenseStore
+from storage import get_expense_store
+
+load_dotenv(Path(__file__).parent / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def horizon_cutoff(horizon_months: int) -> str:
+    today = datetime.now(timezone.utc).date()
+    index = today.year * 12 + (today.month - 1) - horizon_months
+    return f"{index // 12}-{index % 12 + 1:02d}-01"
+
+
+async def run(args):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    store = ArchivingExpenseStore(
+        get_expense_store(db, os.environ.get('EXPENSE_STORAGE', 'flat')),
+        db
+    )
+    await store.create_indexes()
+
+    cutoff = horizon_cutoff(args.horizon_months)
+    user_ids = [args.user] if args.user else await store.user_ids()
+    logger.info(f"Archiving expenses before {cutoff} for {len(user_ids)} users")
+
+    archived_total = 0
+    for user_id in user_ids:
+        archived = await store.archive_user(user_id, cutoff)
+        if archived:
+            logger.info(f"Archived {archived} expenses for user {user_id}")
+        archived_total += archived
+
+    logger.info(f"Archived {archived_total} expenses in total")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--horizon-months",
+        type=int,
+        default=int(os.environ.get('ARCHIVE_HORIZON_MONTHS', 24)),
+        help="keep this many months (plus the current one) in the live store"
+    )
+    parser.add_argument("--user", help="archive a single user instead of everyone")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compare range-scan cost of the flat and bucketed expense layouts.
+
+Seeds one synthetic user into a scratch database in both layouts, then
+times the scans the API issues (full history, a three-month window, a
+category filter and the monthly category totals) and reports how many
+documents MongoDB examined for each.
+
+    python benchmark_storage.py --expenses 50000 --years 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from storage import FlatExpenseStore, BucketedExpenseStore
+
+load_dotenv(Path(__file__).parent / '.env')
+
+CATEGORIES = ['Food', 'Transport', 'Utilities', 'Entertainment', 'Shopping', 'Health', 'Bills', 'Rent', 'Others']
+
+
+def generate_expenses(user_id: str, count: int, years: int, seed: int):
+    rng = random.Random(seed)
+    first_day = date.today() - timedelta(days=365 * years)
+    span = 365 * years
+    for n in range(count):
+        day = first_day + timedelta(days=rng.randrange(span))
+        category_id = rng.randrange(len(CATEGORIES))
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": user_id,
+            "amount": round(rng.lognormvariate(3, 1), 2),
+            "category": CATEGORIES[category_id],
+            "category_id": category_id + 1,
+            "description": f"Synthetic expense {n}",
+            "date": day.isoformat(),
+            "created_at": day.isoformat(),
+            "updated_at": day.isoformat(),
+            "version": n + 1
+        }
+
+
+async def docs_examined(db, collection: str, query: dict, sort: dict) -> int:
+    explain = await db.command(
+        "explain",
+        {"find": collection, "filter": query, "sort": sort},
+        verbosity="executionStats"
+    )
+    return explain["executionStats"]["totalDocsExamined"]
+
+
+async def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def run(args):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[args.db]
+    await db.expenses.drop()
+    await db.expense_buckets.drop()
+
+    user_id = str(uuid.uuid4())
+    expenses = list(generate_expenses(user_id, args.expenses, args.years, args.seed))
+    stores = {"flat": FlatExpenseStore(db), "bucketed": BucketedExpenseStore(db)}
+    for store in stores.values():
+        await store.create_indexes()
+        for offset in range(0, len(expenses), 5000):
+            await store.insert_many(expenses[offset:offset + 5000])
+
+    today = date.today()
+    window_start = (today - timedelta(days=90)).isoformat()
+    scans = {
+        "full history": dict(),
+        "last 3 months": dict(start_date=window_start),
+        "category=Food": dict(category_id=CATEGORIES.index("Food") + 1),
+    }
+
+    print(f"{args.expenses} expenses over {args.years} years, {args.repeat} runs each\n")
+    print(f"{'scan':<22}{'layout':<10}{'rows':>8}{'docs examined':>16}{'ms':>10}")
+    for name, filters in scans.items():
+        for layout, store in stores.items():
+            rows = await store.find(user_id, **filters)
+            elapsed = await timed(lambda: store.find(user_id, **filters), args.repeat)
+            if layout == "flat":
+                query = {"user_id": user_id}
+                if "category_id" in filters:
+                    query["category_id"] = filters["category_id"]
+                if "start_date" in filters:
+                    query["date"] = {"$gte": filters["start_date"]}
+                examined = await docs_examined(db, "expenses", query, {"date": -1})
+            else:
+                query = {"user_id": user_id}
+                if "start_date" in filters:
+                    query["month"] = {"$gte": filters["start_date"][:7]}
+                if "category_id" in filters:
+                    query["expenses.category_id"] = filters["category_id"]
+                examined = await docs_examined(db, "expense_buckets", query, {"month": -1})
+            print(f"{name:<22}{layout:<10}{len(rows):>8}{examined:>16}{elapsed:>10.1f}")
+
+    for layout, store in stores.items():
+        elapsed = await timed(lambda: store.monthly_category_totals(user_id), args.repeat)
+        print(f"{'category totals':<22}{layout:<10}{'':>8}{'':>16}{elapsed:>10.1f}")
+
+    if not args.keep:
+        await db.expenses.drop()
+        await db.expense_buckets.drop()
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="expense_storage_benchmark", help="scratch database, dropped before the run")
+    parser.add_argument("--expenses", type=int, default=20000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="leave the seeded collections in place")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Per-user category dictionary.
+
+Category names are free-form, so "Food", "food " and "FOOD" would
+otherwise be three categories. db.categories maps each user's normalized
+names (whitespace collapsed, case folded) to a small integer id and the
+display name first seen for it, and keeps a running total and count that
+the write paths adjust. Expenses, recurring rules and budgets store the
+display name plus `category_id`, so filters match on the id and the
+category list is a read of one document per category.
+
+A name's id and display name never change once assigned, so lookups are
+cached per process without any invalidation. Only hits are cached: a name
+another worker creates is found on the next lookup.
+"""
+from collections import OrderedDict
+from typing import List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+CACHE_SIZE = 10000
+
+
+def display_name(name: str) -> str:
+    return " ".join(name.split())
+
+
+def normalize_category(name: str) -> str:
+    return display_name(name).casefold()
+
+
+class CategoryDictionary:
+    def __init__(self, db, cache_size: int = CACHE_SIZE):
+        self.collection = db.categories
+        self.counters = db.category_counters
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    async def create_indexes(self):
+        await self.collection.create_index([("user_id", 1), ("key", 1)], unique=True)
+        await self.collection.create_index([("user_id", 1), ("id", 1)], unique=True)
+        await self.counters.create_index("user_id", unique=True)
+
+    def _cached(self, user_id: str, key: str) -> Optional[dict]:
+        entry = self._cache.get((user_id, key))
+        if entry is not None:
+            self._cache.move_to_end((user_id, key))
+        return entry
+
+    def _remember(self, user_id: str, key: str, entry: dict):
+        self._cache[(user_id, key)] = {"id": entry["id"], "name": entry["name"]}
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def lookup(self, user_id: str, name: str) -> Optional[dict]:
+        """Return the {id, name} entry for `name`, or None if the user has never used it."""
+        key = normalize_category(name)
+        entry = self._cached(user_id, key)
+        if entry is None:
+            entry = await self.collection.find_one({"user_id": user_id, "key": key}, {"_id": 0, "id": 1, "name": 1})
+            if entry:
+                self._remember(user_id, key, entry)
+        return entry
+
+    async def resolve(self, user_id: str, name: str) -> dict:
+        """Like lookup(), but creates the category on first use."""
+        entry = await self.lookup(user_id, name)
+        if entry:
+            return entry
+
+        key = normalize_category(name)
+        counter = await self.counters.find_one_and_update(
+            {"user_id": user_id},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        try:
+            entry = await self.collection.find_one_and_update(
+                {"user_id": user_id, "key": key},
+                {"$setOnInsert": {"id": counter["seq"], "name": display_name(name), "total": 0, "count": 0}},
+                projection={"_id": 0, "id": 1, "name": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another request created it first; its id wins
+            entry = await self.collection.find_one({"user_id": user_id, "key": key}, {"_id": 0, "id": 1, "name": 1})
+        self._remember(user_id, key, entry)
+        return entry
+
+    async def record(self, user_id: str, expense: dict, sign: int = 1):
+        """Apply one stored expense to its category's running total and count."""
+        category_id = expense.get("category_id")
+        if category_id is None:
+            category_id = (await self.resolve(user_id, expense["category"]))["id"]
+        await self.collection.update_one(
+            {"user_id": user_id, "id": category_id},
+            {"$inc": {"total": sign * expense["amount"], "count": sign}}
+        )
+
+    async def record_many(self, expenses: List[dict], sign: int = 1):
+        """Like record(), for a batch of expenses: one summed increment per category."""
+        increments = {}
+        for expense in expenses:
+            category_id = expense.get("category_id")
+            if category_id is None:
+                category_id = (await self.resolve(expense["user_id"], expense["category"]))["id"]
+            total, count = increments.get((expense["user_id"], category_id), (0, 0))
+            increments[(expense["user_id"], category_id)] = (total + sign * expense["amount"], count + sign)
+        if increments:
+            await self.collection.bulk_write([
+                UpdateOne({"user_id": user_id, "id": category_id}, {"$inc": {"total": total, "count": count}})
+                for (user_id, category_id), (total, count) in increments.items()
+            ], ordered=False)
+
+    async def set_totals(self, user_id: str, totals: dict):
+        """Overwrite the running totals with {category_id: (total, count)}, zeroing the rest."""
+        await self.collection.update_many({"user_id": user_id}, {"$set": {"total": 0, "count": 0}})
+        for category_id, (total, count) in totals.items():
+            await self.collection.update_one(
+                {"user_id": user_id, "id": category_id},
+                {"$set": {"total": total, "count": count}}
+            )
+
+    async def list(self, user_id: str) -> List[dict]:
+        rows = await self.collection.find(
+            {"user_id": user_id},
+            {"_id": 0, "id": 1, "name": 1, "total": 1, "count": 1}
+        ).to_list(None)
+        # A handful of rows per user: cheaper to order here than to index
+        return sorted(rows, key=lambda row: row["name"])
@@ -0,0 +1,179 @@
+"""
+Negotiated gzip/Brotli response compression.
+
+A pure ASGI middleware, so streaming responses (the CSV export) are
+compressed chunk by chunk and flushed as they go instead of being
+buffered. Bodies that arrive in a single message below `minimum_size`,
+non-text content types and responses that already carry a
+Content-Encoding are passed through untouched.
+
+The client's Accept-Encoding q-values pick between Brotli (when the
+`brotli` package is installed) and gzip; Brotli wins a tie.
+"""
+import threading
+import time
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+class CompressionMetrics:
+    """Process-wide counters for bytes saved and CPU time spent compressing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._encodings = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float, responses: int = 0):
+        with self._lock:
+            stats = self._encodings.setdefault(
+                encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+            )
+            stats["responses"] += responses
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["cpu_seconds"] += cpu_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            encodings = {name: dict(stats) for name, stats in self._encodings.items()}
+        for stats in encodings.values():
+            stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        return {
+            "encodings": encodings,
+            "bytes_saved": sum(stats["bytes_saved"] for stats in encodings.values()),
+            "cpu_seconds": sum(stats["cpu_seconds"] for stats in encodings.values())
+        }
+
+
+compression_metrics = CompressionMetrics()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the supported encoding the client weights highest (q-value, "*"
+    covering unlisted ones), preferring Brotli on a tie. None when the
+    client accepts neither.
+    """
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        qualities[name.strip()] = quality
+
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Compress a chunk and flush it so the client can decode it now."""
+        started = time.thread_time()
+        if self.encoding == "br":
+            output = self._compressor.process(data)
+            output += self._compressor.finish() if final else self._compressor.flush()
+        else:
+            output = self._compressor.compress(data)
+            output += self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        compression_metrics.record(
+            self.encoding, len(data), len(output), time.thread_time() - started, responses=int(final)
+        )
+        return output
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    # Hold the headers until the first body chunk decides
+                    # whether compressing is worth it
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=list(start_message["headers"]))
+                start_message["headers"] = headers.raw
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                compressed = compressor.compress(body, final=not more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(compressed))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+                return
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body
+            })
+
+        await self.app(scope, receive, send_wrapper)
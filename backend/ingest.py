@@ -0,0 +1,201 @@
+"""
+Group-commit ingestion for high-rate expense writes.
+
+With INGEST_BATCHING enabled, create_expense hands its row to a
+GroupCommitWriter instead of inserting it directly. The writer buffers
+rows from concurrent requests and a single flusher task writes them with
+one insert_many per batch, as soon as `max_batch` rows are waiting or
+`max_delay` seconds after the first one arrived. Each caller is only
+released once the batch holding its row has been acknowledged by MongoDB
+(under the write concern of the connection string), so a 201 still means
+the row is stored.
+
+The per-row bookkeeping of the direct path is batched too: the flusher
+reserves one block of sync versions per user in the batch, and passes
+the rows that were written to `on_commit` so the running totals are
+adjusted with one bulk write per batch.
+
+The buffer is bounded: when `max_pending` rows are waiting, submit()
+blocks until the flusher catches up. close() flushes whatever is
+buffered; the app calls it on shutdown.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from sync import reserve_versions
+
+LATENCY_WINDOW = 1000
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class IngestMetrics:
+    """Batch sizes and the latency batching adds, for one writer."""
+
+    def __init__(self):
+        self.batches = 0
+        self.expenses = 0
+        self.max_batch_size = 0
+        self.commit_seconds = 0.0
+        # Time each row spent buffered before its batch started writing
+        self._recent_waits = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, waits: List[float], commit_seconds: float):
+        self.batches += 1
+        self.expenses += len(waits)
+        self.max_batch_size = max(self.max_batch_size, len(waits))
+        self.commit_seconds += commit_seconds
+        self._recent_waits.extend(waits)
+
+    def snapshot(self) -> dict:
+        waits = list(self._recent_waits)
+        return {
+            "batches": self.batches,
+            "expenses": self.expenses,
+            "mean_batch_size": round(self.expenses / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "mean_commit_ms": round(self.commit_seconds / self.batches * 1000, 3) if self.batches else 0,
+            "added_latency_ms": {
+                "mean": round(sum(waits) / len(waits) * 1000, 3) if waits else 0,
+                "p50": round(_percentile(waits, 0.5) * 1000, 3),
+                "p99": round(_percentile(waits, 0.99) * 1000, 3),
+                "max": round(max(waits, default=0) * 1000, 3)
+            }
+        }
+
+
+class GroupCommitWriter:
+    def __init__(self, store, db, on_commit: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+                 max_batch: int = 500, max_delay: float = 0.005, max_pending: int = 10000):
+        self.store = store
+        self.db = db
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics = IngestMetrics()
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._flusher = None
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, expense: dict):
+        """
+        Buffer one expense and return once the batch holding it is written.
+        The expense's `version` is set when its batch is flushed.
+        """
+        if self._closing:
+            raise RuntimeError("Ingestion writer is shutting down")
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((expense, future, time.perf_counter()))
+        await future
+
+    async def _next_batch(self):
+        """Wait for a first row, then collect more until the batch is full or the delay is up."""
+        loop = asyncio.get_running_loop()
+        item = await self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        while True:
+            batch, stop = await self._next_batch()
+            if batch:
+                await self._commit(batch)
+            if stop:
+                return
+
+    async def _commit(self, batch: list):
+        started = time.perf_counter()
+        expenses = [expense for expense, _, _ in batch]
+        counts = {}
+        for expense in expenses:
+            counts[expense["user_id"]] = counts.get(expense["user_id"], 0) + 1
+
+        failed = {}
+        try:
+            async with AsyncExitStack() as leases:
+                # The versions stay leased until the rows holding them are written
+                first_versions = await asyncio.gather(*(
+                    leases.enter_async_context(reserve_versions(self.db, user_id, count))
+                    for user_id, count in counts.items()
+                ))
+                next_versions = dict(zip(counts, first_versions))
+                for expense in expenses:
+                    expense["version"] = next_versions[expense["user_id"]]
+                    next_versions[expense["user_id"]] += 1
+                try:
+                    await self.store.insert_many(expenses)
+                except BulkWriteError as exc:
+                    # Unordered inserts: only the rows listed in writeErrors failed
+                    failed = {error["index"]: exc for error in exc.details.get("writeErrors", [])}
+        except Exception as exc:
+            failed = {index: exc for index in range(len(batch))}
+
+        written = [expense for index, expense in enumerate(expenses) if index not in failed]
+        if written and self.on_commit is not None:
+            try:
+                await self.on_commit(written)
+            except Exception as exc:
+                # The rows are stored but their totals are not; report it like the direct path would
+                failed.update({index: exc for index in range(len(batch)) if index not in failed})
+        self.metrics.record([started - queued_at for _, _, queued_at in batch], time.perf_counter() - started)
+
+        for index, (_, future, _) in enumerate(batch):
+            if future.done():
+                # The caller went away; the row is written regardless
+                continue
+            if index in failed:
+                future.set_exception(failed[index])
+            else:
+                future.set_result(None)
+
+    async def close(self):
+        """Stop accepting rows and write everything still buffered."""
+        self._closing = True
+        if self._flusher is not None:
+            await self._queue.put(None)
+            await self._flusher
+        # Callers that were blocked on a full buffer enqueue once space frees up
+        while True:
+            await asyncio.sleep(0)
+            if self._queue.empty():
+                break
+            batch = []
+            while not self._queue.empty() and len(batch) < self.max_batch:
+                item = self._queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                await self._commit(batch)
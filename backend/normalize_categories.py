@@ -0,0 +1,151 @@
+"""
+Build the category dictionary from existing data.
+
+Expenses written before categories were normalized carry free-form names
+and no `category_id`. For each user this groups every expense (live and
+archived), recurring rule and budget by normalized name, assigns ids,
+rewrites them with the canonical name and id and recomputes the running
+totals. The most frequent spelling of a new name becomes its display name.
+
+Safe to re-run. The totals are recomputed from a snapshot, so run it while
+writes are paused.
+
+    python normalize_categories.py
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from archive import ArchivingExpenseStore
+from categories import CategoryDictionary, display_name, normalize_category
+from storage import category_totals, get_expense_store
+from sync import reserve_versions
+
+load_dotenv(Path(__file__).parent / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def normalize_user(db, store: ArchivingExpenseStore, categories: CategoryDictionary, user_id: str) -> int:
+    expenses = await store.find(user_id)
+    rules = await db.recurring_expenses.find({"user_id": user_id}, {"_id": 0}).to_list(None)
+    budgets = await db.budgets.find({"user_id": user_id}, {"_id": 0}).to_list(None)
+
+    spellings = {}
+    for doc in expenses + rules + budgets:
+        spellings.setdefault(normalize_category(doc["category"]), Counter())[display_name(doc["category"])] += 1
+    entries = {}
+    for key, names in spellings.items():
+        entries[key] = await categories.resolve(user_id, names.most_common(1)[0][0])
+
+    def canonical(doc: dict) -> dict:
+        entry = entries[normalize_category(doc["category"])]
+        return {**doc, "category": entry["name"], "category_id": entry["id"]}
+
+    # Rewritten expenses and rules get new versions, as on the API write
+    # paths, so synced clients pick up the new names
+    live = await store.live.find(user_id)
+    live_ids = {exp["id"] for exp in live}
+    stamped = sum(1 for doc in expenses + rules if canonical(doc) != doc)
+    updated_at = datetime.now(timezone.utc).isoformat()
+
+    changed = 0
+    async with reserve_versions(db, user_id, stamped) as first_version:
+        versions = itertools.count(first_version)
+        assigned = {}
+
+        def stamp(doc: dict) -> dict:
+            fixed = canonical(doc)
+            if fixed == doc:
+                return doc
+            # An archived month that is retried sees its rows again
+            if doc["id"] not in assigned:
+                assigned[doc["id"]] = next(versions)
+            return {**fixed, "version": assigned[doc["id"]], "updated_at": updated_at}
+
+        for exp in live:
+            fixed = stamp(exp)
+            if fixed is not exp:
+                await store.live.update(user_id, exp["id"], {
+                    key: fixed[key] for key in ("category", "category_id", "version", "updated_at")
+                })
+                changed += 1
+        changed += await store.rewrite_archived(
+            user_id, lambda exp: exp if exp["id"] in live_ids else stamp(exp)
+        )
+
+        for rule in rules:
+            fixed = stamp(rule)
+            if fixed is not rule:
+                await db.recurring_expenses.update_one(
+                    {"id": rule["id"], "user_id": user_id},
+                    {"$set": {"category": fixed["category"], "category_id": fixed["category_id"], "version": fixed["version"]}}
+                )
+                changed += 1
+
+    for budget in budgets:
+        fixed = canonical(budget)
+        if fixed != budget:
+            await db.budgets.update_one(
+                {"id": budget["id"], "user_id": user_id},
+                {"$set": {"category": fixed["category"], "category_id": fixed["category_id"]}}
+            )
+            changed += 1
+
+    totals = category_totals([canonical(exp) for exp in expenses])
+    await categories.set_totals(user_id, {
+        entries[normalize_category(name)]["id"]: (total, count)
+        for name, (total, count) in totals.items()
+    })
+
+    if changed:
+        # The forecast's monthly totals are keyed by name; let them reseed
+        await db.forecast_stats.delete_many({"user_id": user_id})
+        await db.forecast_models.delete_many({"user_id": user_id})
+    return changed
+
+
+async def run(args):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    store = ArchivingExpenseStore(
+        get_expense_store(db, os.environ.get('EXPENSE_STORAGE', 'flat')),
+        db
+    )
+    categories = CategoryDictionary(db)
+    await categories.create_indexes()
+
+    user_ids = [args.user] if args.user else await db.users.distinct("id")
+    logger.info(f"Normalizing categories for {len(user_ids)} users")
+
+    changed_total = 0
+    for user_id in user_ids:
+        changed = await normalize_user(db, store, categories, user_id)
+        if changed:
+            logger.info(f"Rewrote {changed} documents for user {user_id}")
+        changed_total += changed
+
+    logger.info(f"Rewrote {changed_total} documents in total")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="normalize a single user instead of everyone")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Seed a database with a synthetic, production-scale dataset.
+
+Generates users, their expenses, category dictionaries and budgets and
+writes them straight into MongoDB with batched insert_many calls, spread
+over parallel worker processes. The data is skewed the way real usage is:
+
+- a few heavy users hold most of the expenses (Pareto-distributed
+  activity);
+- each user favours some categories over others, on top of a global skew
+  towards everyday categories;
+- amounts are log-normal with a per-category scale, so Rent is large and
+  rare while Food is small and frequent;
+- dates span several years, with more spending towards the weekend;
+- budgets are set each month for every user's three biggest categories,
+  near their usual spend.
+
+The output depends only on --seed and --end-date, not on the number of
+workers, so two runs with the same arguments produce the same rows.
+Seeded users can log in with the password given by --password.
+
+    python seed_data.py --users 5000 --expenses 2000000 --years 3 --workers 8 --drop
+
+Indexes are not built here; the API creates them on startup, which is
+faster after a bulk load than maintaining them during it.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+
+from categories import normalize_category
+from storage import get_expense_store
+
+load_dotenv(Path(__file__).parent / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# name, relative frequency, log-normal mu and sigma of the amount
+CATEGORY_PROFILES = [
+    ("Food", 30, 2.7, 0.6),
+    ("Transport", 16, 2.4, 0.7),
+    ("Shopping", 12, 3.6, 1.0),
+    ("Entertainment", 10, 3.1, 0.8),
+    ("Others", 9, 3.0, 1.2),
+    ("Bills", 8, 4.3, 0.5),
+    ("Utilities", 7, 4.1, 0.4),
+    ("Health", 5, 3.8, 1.1),
+    ("Rent", 3, 7.0, 0.3),
+]
+# Relative spending by weekday, Monday first
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.9, 0.9, 1.2, 1.5, 1.3]
+USER_ACTIVITY_ALPHA = 1.2
+BUDGETED_CATEGORIES = 3
+
+SEEDED_COLLECTIONS = [
+    "users", "expenses", "expense_buckets", "categories", "category_counters", "budgets",
+    "sync_counters", "forecast_stats", "forecast_models", "recurring_expenses",
+    "expense_tombstones", "expense_archive", "expense_month_summaries", "archive_state",
+]
+
+
+def user_rng(seed: int, index: int) -> random.Random:
+    return random.Random(f"{seed}:{index}")
+
+
+def expense_counts(seed: int, users: int, expenses: int) -> list:
+    """Split `expenses` over `users` with a heavy-tailed activity distribution."""
+    weights = [user_rng(seed, index).paretovariate(USER_ACTIVITY_ALPHA) for index in range(users)]
+    scale = expenses / sum(weights)
+    counts = [math.floor(weight * scale) for weight in weights]
+    for index in range(expenses - sum(counts)):
+        counts[index % users] += 1
+    return counts
+
+
+def generate_expenses(rng: random.Random, user_id: str, count: int, first_day: date, last_day: date) -> list:
+    # Each user leans towards some categories on top of the global skew
+    weights = [weight * rng.uniform(0.2, 2.0) for _, weight, _, _ in CATEGORY_PROFILES]
+    span = (last_day - first_day).days + 1
+    day_weights = [WEEKDAY_WEIGHTS[(first_day + timedelta(days=n)).weekday()] for n in range(7)]
+
+    expenses = []
+    for n in range(count):
+        category_index = rng.choices(range(len(CATEGORY_PROFILES)), weights)[0]
+        name, _, mu, sigma = CATEGORY_PROFILES[category_index]
+        week = rng.randrange(math.ceil(span / 7))
+        day = first_day + timedelta(days=week * 7 + rng.choices(range(7), day_weights)[0])
+        if day > last_day:
+            day = last_day - timedelta(days=rng.randrange(7))
+        expenses.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": user_id,
+            "amount": round(rng.lognormvariate(mu, sigma), 2),
+            "category": name,
+            "category_id": category_index + 1,
+            "description": f"{name} purchase",
+            "date": day.isoformat(),
+            "created_at": f"{day.isoformat()}T12:00:00+00:00",
+            "updated_at": f"{day.isoformat()}T12:00:00+00:00",
+        })
+    expenses.sort(key=lambda exp: exp["date"])
+    for version, exp in enumerate(expenses, start=1):
+        exp["version"] = version
+    return expenses
+
+
+def category_documents(user_id: str, expenses: list) -> list:
+    totals = {}
+    for exp in expenses:
+        entry = totals.setdefault(exp["category_id"], [0, 0])
+        entry[0] += exp["amount"]
+        entry[1] += 1
+    return [
+        {
+            "user_id": user_id,
+            "id": index + 1,
+            "key": normalize_category(name),
+            "name": name,
+            "total": round(totals.get(index + 1, [0, 0])[0], 2),
+            "count": totals.get(index + 1, [0, 0])[1]
+        }
+        for index, (name, _, _, _) in enumerate(CATEGORY_PROFILES)
+    ]
+
+
+def budget_documents(rng: random.Random, user_id: str, expenses: list, first_day: date, last_day: date) -> list:
+    months = (last_day.year - first_day.year) * 12 + last_day.month - first_day.month + 1
+    by_category = {}
+    for exp in expenses:
+        by_category[exp["category_id"]] = by_category.get(exp["category_id"], 0) + exp["amount"]
+    top = sorted(by_category, key=by_category.get, reverse=True)[:BUDGETED_CATEGORIES]
+
+    budgets = []
+    for month_index in range(months):
+        index = first_day.year * 12 + first_day.month - 1 + month_index
+        for category_id in top:
+            usual = by_category[category_id] / months
+            budgets.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": user_id,
+                "category": CATEGORY_PROFILES[category_id - 1][0],
+                "category_id": category_id,
+                "monthly_limit": max(10, round(usual * rng.uniform(0.9, 1.3), -1)),
+                "month": index % 12 + 1,
+                "year": index // 12
+            })
+    return budgets
+
+
+def generate_user(seed: int, index: int, count: int, first_day: date, last_day: date, password_hash: str) -> dict:
+    rng = user_rng(seed, index)
+    rng.paretovariate(USER_ACTIVITY_ALPHA)  # the activity weight drawn by expense_counts
+    user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    expenses = generate_expenses(rng, user_id, count, first_day, last_day)
+    return {
+        "user": {
+            "id": user_id,
+            "name": f"Seed User {index}",
+            "email": f"seed-user-{index}@example.com",
+            "password_hash": password_hash,
+            "created_at": f"{first_day.isoformat()}T00:00:00+00:00"
+        },
+        "expenses": expenses,
+        "categories": category_documents(user_id, expenses),
+        "budgets": budget_documents(rng, user_id, expenses, first_day, last_day)
+    }
+
+
+async def seed_users(options: dict, assignments: list) -> int:
+    client = AsyncIOMotorClient(options["mongo_url"])
+    db = client[options["db"]]
+    store = get_expense_store(db, options["layout"])
+    first_day, last_day = date.fromisoformat(options["first_day"]), date.fromisoformat(options["last_day"])
+
+    pending = {"users": [], "expenses": [], "categories": [], "category_counters": [], "sync_counters": [], "budgets": []}
+    written = 0
+
+    async def flush():
+        await store.insert_many(pending["expenses"])
+        for name, docs in pending.items():
+            if name != "expenses" and docs:
+                await db[name].insert_many(docs, ordered=False)
+        for docs in pending.values():
+            docs.clear()
+
+    for index, count in assignments:
+        data = generate_user(options["seed"], index, count, first_day, last_day, options["password_hash"])
+        user_id = data["user"]["id"]
+        pending["users"].append(data["user"])
+        pending["expenses"].extend(data["expenses"])
+        pending["categories"].extend(data["categories"])
+        pending["category_counters"].append({"user_id": user_id, "seq": len(CATEGORY_PROFILES)})
+        pending["sync_counters"].append({"user_id": user_id, "seq": count})
+        pending["budgets"].extend(data["budgets"])
+        written += count
+        if len(pending["expenses"]) >= options["batch_size"]:
+            await flush()
+    await flush()
+    client.close()
+    return written
+
+
+def run_worker(options: dict, assignments: list):
+    started = time.perf_counter()
+    written = asyncio.run(seed_users(options, assignments))
+    return written, time.perf_counter() - started
+
+
+def assign_users(counts: list, workers: int) -> list:
+    """Give each worker a similar number of expenses, heaviest users first."""
+    assignments = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for index in sorted(range(len(counts)), key=lambda i: counts[i], reverse=True):
+        worker = loads.index(min(loads))
+        assignments[worker].append((index, counts[index]))
+        loads[worker] += counts[index]
+    return [assignment for assignment in assignments if assignment]
+
+
+async def drop_collections(mongo_url: str, db_name: str):
+    client = AsyncIOMotorClient(mongo_url)
+    for name in SEEDED_COLLECTIONS:
+        await client[db_name].drop_collection(name)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.environ.get('DB_NAME'), help="target database (default: DB_NAME)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--expenses", type=int, default=1000000, help="total expenses across all users")
+    parser.add_argument("--years", type=int, default=3, help="length of the history")
+    parser.add_argument("--end-date", default=date.today().isoformat(), help="last day of the history")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-size", type=int, default=5000, help="expenses per insert_many")
+    parser.add_argument("--layout", default=os.environ.get('EXPENSE_STORAGE', 'flat'), choices=["flat", "bucketed"])
+    parser.add_argument("--password", default="seed-password", help="password of every seeded user")
+    parser.add_argument("--drop", action="store_true", help="drop the app's collections first")
+    args = parser.parse_args()
+
+    mongo_url = os.environ['MONGO_URL']
+    last_day = date.fromisoformat(args.end_date)
+    first_day = last_day - timedelta(days=365 * args.years - 1)
+    if args.drop:
+        logger.info(f"Dropping seeded collections in {args.db}")
+        asyncio.run(drop_collections(mongo_url, args.db))
+
+    options = {
+        "mongo_url": mongo_url,
+        "db": args.db,
+        "layout": args.layout,
+        "seed": args.seed,
+        "first_day": first_day.isoformat(),
+        "last_day": last_day.isoformat(),
+        "batch_size": args.batch_size,
+        # bcrypt is slow on purpose: hash once and share it
+        "password_hash": CryptContext(schemes=["bcrypt"], deprecated="auto").hash(args.password)
+    }
+    assignments = assign_users(expense_counts(args.seed, args.users, args.expenses), args.workers)
+    logger.info(
+        f"Seeding {args.users} users and {args.expenses} expenses ({first_day} to {last_day}) "
+        f"into {args.db} ({args.layout} layout) with {len(assignments)} workers"
+    )
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(assignments)) as executor:
+        results = list(executor.map(run_worker, [options] * len(assignments), assignments))
+    elapsed = time.perf_counter() - started
+
+    for worker, (written, seconds) in enumerate(results):
+        logger.info(f"Worker {worker}: {written} expenses in {seconds:.1f}s ({written / seconds:,.0f}/s)")
+    total = sum(written for written, _ in results)
+    logger.info(f"Inserted {total} expenses in {elapsed:.1f}s ({total / elapsed:,.0f} expenses/s overall)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,193 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from storage import get_expense_store
+from archive import ArchivingExpenseStore
+from categories import CategoryDictionary
+from ingest import GroupCommitWriter
+from sync import reserve_versions, sync_watermark
+from compression import CompressionMiddleware, compression_metrics
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import List, Optional, Literal
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, date
 from passlib.context import CryptContext
 import jwt
 import csv
 import io
+import asyncio
+import time
+from contextlib import asynccontextmanager
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 # JWT Configuration
-SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+CSV_CHUNK_ROWS = 500
+
+# Forecast Configuration
+FORECAST_HISTORY_MONTHS = 12
+FORECAST_SMOOTHING = 0.5
+
 security = HTTPBearer()
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Settings
+class Settings(BaseModel):
+    mongo_url: str
+    db_name: str
+    jwt_secret_key: str = 'your-secret-key-change-in-production'
+    cors_origins: List[str] = ['*']
+    # "flat" (one document per expense) or "bucketed" (one document per
+    # user and month, for high-volume users)
+    expense_storage: str = 'flat'
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    brotli_quality: int = 4
+    create_indexes: bool = True
+    # Group-commit expense creation: buffer concurrent creates and write
+    # them with one insert_many per batch
+    ingest_batching: bool = False
+    ingest_batch_size: int = 500
+    ingest_max_delay_ms: float = 5
+    ingest_max_pending: int = 10000
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mongo_url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            jwt_secret_key=os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production'),
+            cors_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+            expense_storage=os.environ.get('EXPENSE_STORAGE', 'flat'),
+            compression_min_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+            compression_level=int(os.environ.get('COMPRESSION_LEVEL', 6)),
+            brotli_quality=int(os.environ.get('BROTLI_QUALITY', 4)),
+            create_indexes=os.environ.get('CREATE_INDEXES', 'true').lower() == 'true',
+            ingest_batching=os.environ.get('INGEST_BATCHING', 'false').lower() == 'true',
+            ingest_batch_size=int(os.environ.get('INGEST_BATCH_SIZE', 500)),
+            ingest_max_delay_ms=float(os.environ.get('INGEST_MAX_DELAY_MS', 5)),
+            ingest_max_pending=int(os.environ.get('INGEST_MAX_PENDING', 10000))
+        )
+
+class AppResources:
+    """
+    Expensive per-app dependencies, created on first use rather than at
+    import time. The time each one took to initialize is kept in `timings`
+    for the startup report.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.timings = {}
+        self._client = None
+        self._expense_store = None
+        self._categories = None
+        self._ingest_writer = None
+        self._pwd_context = None
+
+    def _timed(self, name: str, factory):
+        started = time.perf_counter()
+        value = factory()
+        self.timings[name] = time.perf_counter() - started
+        return value
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        if self._client is None:
+            self._client = self._timed("mongo_client", lambda: AsyncIOMotorClient(self.settings.mongo_url))
+        return self._client
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        return self.client[self.settings.db_name]
+
+    @property
+    def expense_store(self) -> ArchivingExpenseStore:
+        # Expenses moved out by archive_expenses.py are read back transparently
+        if self._expense_store is None:
+            self._expense_store = self._timed("expense_store", lambda: ArchivingExpenseStore(
+                get_expense_store(self.db, self.settings.expense_storage),
+                self.db
+            ))
+        return self._expense_store
+
+    @property
+    def categories(self) -> CategoryDictionary:
+        if self._categories is None:
+            self._categories = self._timed("categories", lambda: CategoryDictionary(self.db))
+        return self._categories
+
+    @property
+    def ingest_writer(self) -> Optional[GroupCommitWriter]:
+        if self._ingest_writer is None and self.settings.ingest_batching:
+            self._ingest_writer = self._timed("ingest_writer", lambda: GroupCommitWriter(
+                self.expense_store,
+                self.db,
+                on_commit=self._record_ingested,
+                max_batch=self.settings.ingest_batch_size,
+                max_delay=self.settings.ingest_max_delay_ms / 1000,
+                max_pending=self.settings.ingest_max_pending
+            ))
+        return self._ingest_writer
+
+    async def _record_ingested(self, expenses: List[dict]):
+        await self.categories.record_many(expenses)
+        await record_batch_stats(self.db, expenses)
+
+    @property
+    def pwd_context(self) -> CryptContext:
+        if self._pwd_context is None:
+            self._pwd_context = self._timed("pwd_context", lambda: CryptContext(schemes=["bcrypt"], deprecated="auto"))
+        return self._pwd_context
+
+    async def close(self):
+        """Release everything created so far; the next use starts afresh."""
+        if self._ingest_writer is not None:
+            await self._ingest_writer.close()
+        if self._client is not None:
+            self._client.close()
+        # The store and dictionary hold collections of the closed client
+        self._client = None
+        self._expense_store = None
+        self._categories = None
+        self._ingest_writer = None
+        self._pwd_context = None
+
+# Dependencies
+def get_db(request: Request) -> AsyncIOMotorDatabase:
+    return request.app.state.resources.db
+
+def get_store(request: Request) -> ArchivingExpenseStore:
+    return request.app.state.resources.expense_store
+
+def get_categories(request: Request) -> CategoryDictionary:
+    return request.app.state.resources.categories
+
+def get_ingest_writer(request: Request) -> Optional[GroupCommitWriter]:
+    return request.app.state.resources.ingest_writer
+
+def get_pwd_context(request: Request) -> CryptContext:
+    return request.app.state.resources.pwd_context
+
 # Models
 class UserRegister(BaseModel):
     name: str
@@ -59,7 +211,7 @@ class TokenResponse(BaseModel):
 
 class ExpenseCreate(BaseModel):
     amount: float
-    category: str
+    category: str = Field(pattern=r"\S")
     description: str
     date: str
 
@@ -69,12 +221,48 @@ class Expense(BaseModel):
     user_id: str
     amount: float
     category: str
+    category_id: Optional[int] = None
     description: str
     date: str
     created_at: str
+    recurring_id: Optional[str] = None
+    updated_at: Optional[str] = None
+    version: int = 0
 
-class BudgetCreate(BaseModel):
+class ExpenseChanges(BaseModel):
+    changes: List[Expense]
+    deleted: List[str]
+    # Recurring rules deleted since the token; clients drop their
+    # unedited occurrences
+    deleted_rules: List[str] = []
+    token: str
+
+class RecurringExpenseCreate(BaseModel):
+    amount: float
+    category: str = Field(pattern=r"\S")
+    description: str
+    frequency: Literal["daily", "weekly", "monthly", "yearly"]
+    interval: int = Field(default=1, ge=1)
+    start_date: str
+    end_date: Optional[str] = None
+
+class RecurringExpense(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    user_id: str
+    amount: float
     category: str
+    category_id: Optional[int] = None
+    description: str
+    frequency: str
+    interval: int
+    start_date: str
+    end_date: Optional[str] = None
+    created_at: str
+    version: int = 0
+
+class BudgetCreate(BaseModel):
+    category: str = Field(pattern=r"\S")
     monthly_limit: float
     month: int
     year: int
@@ -84,10 +272,18 @@ class Budget(BaseModel):
     id: str
     user_id: str
     category: str
+    category_id: Optional[int] = None
     monthly_limit: float
     month: int
     year: int
 
+class Category(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: int
+    name: str
+    total: float
+    count: int
+
 class CategorySummary(BaseModel):
     category: str
     total: float
@@ -99,24 +295,49 @@ class AnalyticsSummary(BaseModel):
     categories: List[CategorySummary]
     monthly_trend: List[dict]
 
+class CategoryForecast(BaseModel):
+    category: str
+    spent_to_date: float
+    projected_total: float
+
+class SpendingForecast(BaseModel):
+    month: str
+    days_elapsed: int
+    days_in_month: int
+    spent_to_date: float
+    projected_total: float
+    categories: List[CategoryForecast]
+
+class BudgetStatus(BaseModel):
+    category: str
+    monthly_limit: float
+    spent: float
+    remaining: float
+
+class DashboardData(BaseModel):
+    summary: AnalyticsSummary
+    recent_expenses: List[Expense]
+    budgets: List[BudgetStatus]
+    forecast: SpendingForecast
+
 # Helper functions
-def verify_password(plain_password, hashed_password):
+def verify_password(pwd_context: CryptContext, plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
+def get_password_hash(pwd_context: CryptContext, password):
     return pwd_context.hash(password)
 
-def create_access_token(data: dict):
+def create_access_token(data: dict, secret_key: str):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, request.app.state.settings.jwt_secret_key, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -128,9 +349,283 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
 
+# Recurring expense helpers
+OCCURRENCE_SEPARATOR = "_"
+
+def occurrence_id(rule_id: str, occurrence_date: str) -> str:
+    return f"{rule_id}{OCCURRENCE_SEPARATOR}{occurrence_date}"
+
+def parse_occurrence_id(expense_id: str):
+    rule_id, sep, occurrence_date = expense_id.partition(OCCURRENCE_SEPARATOR)
+    if not sep:
+        return None
+    return rule_id, occurrence_date
+
+def add_months(start: date, months: int) -> date:
+    index = start.year * 12 + (start.month - 1) + months
+    year, month = index // 12, index % 12 + 1
+    last_day = days_in_month(f"{year}-{month:02d}")
+    return date(year, month, min(start.day, last_day))
+
+def nth_occurrence(rule: dict, start: date, n: int) -> date:
+    step = n * rule["interval"]
+    if rule["frequency"] == "daily":
+        return start + timedelta(days=step)
+    if rule["frequency"] == "weekly":
+        return start + timedelta(weeks=step)
+    if rule["frequency"] == "monthly":
+        return add_months(start, step)
+    return add_months(start, 12 * step)
+
+def expand_rule(rule: dict, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[dict]:
+    """
+    Expand a recurring rule into the expense rows it stands for within
+    [start_date, end_date], bounded by today. Occurrences that were edited
+    or deleted are listed in `exceptions` and skipped here.
+    """
+    first = date.fromisoformat(rule["start_date"][:10])
+    upper = datetime.now(timezone.utc).date()
+    for bound in (rule.get("end_date"), end_date):
+        if bound:
+            upper = min(upper, date.fromisoformat(bound[:10]))
+    lower = date.fromisoformat(start_date[:10]) if start_date else first
+
+    # Jump close to the requested window instead of walking from the start
+    period_days = {"daily": 1, "weekly": 7, "monthly": 31, "yearly": 366}[rule["frequency"]]
+    n = max(0, (lower - first).days // (period_days * rule["interval"]) - 1)
+
+    exceptions = set(rule.get("exceptions", []))
+    occurrences = []
+    current = nth_occurrence(rule, first, n)
+    while current <= upper:
+        occurrence_date = current.isoformat()
+        if current >= lower and occurrence_date not in exceptions:
+            occurrences.append({
+                "id": occurrence_id(rule["id"], occurrence_date),
+                "user_id": rule["user_id"],
+                "amount": rule["amount"],
+                "category": rule["category"],
+                "category_id": rule.get("category_id"),
+                "description": rule["description"],
+                "date": occurrence_date,
+                "created_at": rule["created_at"],
+                "recurring_id": rule["id"],
+                "version": rule.get("version", 0)
+            })
+        n += 1
+        current = nth_occurrence(rule, first, n)
+    return occurrences
+
+async def expand_recurring(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    category_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[dict]:
+    query = {"user_id": user_id}
+    if category_id is not None:
+        query["category_id"] = category_id
+    if end_date:
+        query["start_date"] = {"$lte": end_date}
+    rules = await db.recurring_expenses.find(query, {"_id": 0}).to_list(None)
+
+    occurrences = []
+    for rule in rules:
+        occurrences.extend(expand_rule(rule, start_date, end_date))
+    return occurrences
+
+async def find_occurrence(db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[dict]:
+    parsed = parse_occurrence_id(expense_id)
+    if not parsed:
+        return None
+    rule_id, occurrence_date = parsed
+    rule = await db.recurring_expenses.find_one({"id": rule_id, "user_id": user_id}, {"_id": 0})
+    if not rule:
+        return None
+    occurrences = expand_rule(rule, occurrence_date, occurrence_date)
+    return occurrences[0] if occurrences else None
+
+async def add_rule_exception(db: AsyncIOMotorDatabase, user_id: str, occurrence: dict):
+    await db.recurring_expenses.update_one(
+        {"id": occurrence["recurring_id"], "user_id": user_id},
+        {"$addToSet": {"exceptions": occurrence["date"]}}
+    )
+    await invalidate_forecast(db, user_id)
+
+# Sync helpers
+async def record_tombstones(db: AsyncIOMotorDatabase, user_id: str, expense_ids: List[str]):
+    if not expense_ids:
+        return
+    deleted_at = datetime.now(timezone.utc).isoformat()
+    async with reserve_versions(db, user_id) as version:
+        await db.expense_tombstones.insert_many([
+            {"id": expense_id, "user_id": user_id, "version": version, "deleted_at": deleted_at}
+            for expense_id in expense_ids
+        ])
+
+async def record_rule_tombstone(db: AsyncIOMotorDatabase, user_id: str, rule_id: str):
+    deleted_at = datetime.now(timezone.utc).isoformat()
+    async with reserve_versions(db, user_id) as version:
+        await db.expense_tombstones.insert_one(
+            {"rule_id": rule_id, "user_id": user_id, "version": version, "deleted_at": deleted_at}
+        )
+
+def encode_sync_token(version: int, synced_on: str) -> str:
+    return f"{version}.{synced_on}"
+
+def decode_sync_token(token: str):
+    try:
+        version, synced_on = token.split(".", 1)
+        return int(version), date.fromisoformat(synced_on).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+async def invalidate_forecast(db: AsyncIOMotorDatabase, user_id: str):
+    await db.forecast_models.update_one({"user_id": user_id}, {"$set": {"stale": True}})
+
+# Forecast helpers
+def month_key(date_str: str) -> str:
+    return date_str[:7]  # YYYY-MM
+
+def shift_month(key: str, months: int) -> str:
+    year, month = int(key[:4]), int(key[5:7])
+    index = year * 12 + (month - 1) + months
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+def days_in_month(key: str) -> int:
+    start = datetime.strptime(f"{key}-01", "%Y-%m-%d")
+    end = datetime.strptime(f"{shift_month(key, 1)}-01", "%Y-%m-%d")
+    return (end - start).days
+
+def fit_smoothed_levels(stats: List[dict], current_month: str) -> dict:
+    """
+    Fit an exponentially smoothed monthly level per category from the
+    completed months in `stats`. Months without spend count as zero.
+    """
+    history = {}
+    for row in stats:
+        if row["month"] < current_month:
+            months = history.setdefault(row["category"], {})
+            months[row["month"]] = months.get(row["month"], 0) + row["total"]
+
+    levels = {}
+    for category, months in history.items():
+        month = min(months)
+        level = months[month]
+        while month < shift_month(current_month, -1):
+            month = shift_month(month, 1)
+            level = FORECAST_SMOOTHING * months.get(month, 0) + (1 - FORECAST_SMOOTHING) * level
+        levels[category] = level
+    return levels
+
+async def record_expense_stats(db: AsyncIOMotorDatabase, user_id: str, expense: dict, sign: int = 1):
+    """
+    Apply one expense to the per-user monthly category totals the forecast is
+    fitted from, and invalidate the fitted levels if a completed month moved.
+    """
+    month = month_key(expense["date"])
+    await db.forecast_stats.update_one(
+        {"user_id": user_id, "month": month, "category": expense["category"]},
+        {"$inc": {"total": sign * expense["amount"], "count": sign}},
+        upsert=True
+    )
+    if month < month_key(datetime.now(timezone.utc).date().isoformat()):
+        await invalidate_forecast(db, user_id)
+
+async def record_batch_stats(db: AsyncIOMotorDatabase, expenses: List[dict]):
+    """
+    Like record_expense_stats() for a batch of new expenses, possibly of
+    several users: one summed increment per (user, month, category).
+    """
+    increments = {}
+    stale_users = set()
+    current_month = month_key(datetime.now(timezone.utc).date().isoformat())
+    for expense in expenses:
+        key = (expense["user_id"], month_key(expense["date"]), expense["category"])
+        total, count = increments.get(key, (0, 0))
+        increments[key] = (total + expense["amount"], count + 1)
+        if key[1] < current_month:
+            stale_users.add(expense["user_id"])
+    if increments:
+        await db.forecast_stats.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "month": month, "category": category},
+                {"$inc": {"total": total, "count": count}},
+                upsert=True
+            )
+            for (user_id, month, category), (total, count) in increments.items()
+        ], ordered=False)
+    if stale_users:
+        await db.forecast_models.update_many({"user_id": {"$in": list(stale_users)}}, {"$set": {"stale": True}})
+
+async def seed_forecast_stats(db: AsyncIOMotorDatabase, store: ArchivingExpenseStore, user_id: str):
+    """
+    Build the monthly category totals from full history. Runs once per user;
+    afterwards the totals are maintained incrementally on every write.
+    """
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "month": row["month"], "category": row["category"]},
+            {"$set": {"total": row["total"], "count": row["count"]}},
+            upsert=True
+        )
+        for row in await store.monthly_category_totals(user_id)
+    ]
+    if operations:
+        await db.forecast_stats.bulk_write(operations, ordered=False)
+
+async def load_forecast_levels(db: AsyncIOMotorDatabase, store: ArchivingExpenseStore, user_id: str, current_month: str) -> dict:
+    """
+    Return the cached smoothed levels for the user, refitting them from the
+    monthly totals only when the month rolled over or a past month changed.
+    """
+    model = await db.forecast_models.find_one({"user_id": user_id}, {"_id": 0})
+    if model and model.get("fitted_month") == current_month and not model.get("stale"):
+        return {row["category"]: row["level"] for row in model["levels"]}
+
+    if not model:
+        await seed_forecast_stats(db, store, user_id)
+
+    stats = await db.forecast_stats.find(
+        {
+            "user_id": user_id,
+            "month": {"$gte": shift_month(current_month, -FORECAST_HISTORY_MONTHS), "$lt": current_month}
+        },
+        {"_id": 0}
+    ).to_list(None)
+    last_month = shift_month(current_month, -1)
+    occurrences = await expand_recurring(
+        db,
+        user_id,
+        start_date=f"{shift_month(current_month, -FORECAST_HISTORY_MONTHS)}-01",
+        end_date=f"{last_month}-{days_in_month(last_month):02d}"
+    )
+    stats.extend(
+        {"month": month_key(occ["date"]), "category": occ["category"], "total": occ["amount"]}
+        for occ in occurrences
+    )
+    levels = fit_smoothed_levels(stats, current_month)
+
+    await db.forecast_models.update_one(
+        {"user_id": user_id},
+        {"$set": {
+            "fitted_month": current_month,
+            "stale": False,
+            "levels": [{"category": cat, "level": level} for cat, level in levels.items()]
+        }},
+        upsert=True
+    )
+    return levels
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
-async def register(user_data: UserRegister):
+async def register(
+    user_data: UserRegister,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    pwd_context: CryptContext = Depends(get_pwd_context)
+):
     # Check if user exists
     existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 0})
     if existing_user:
@@ -142,23 +637,28 @@ async def register(user_data: UserRegister):
         "id": user_id,
         "name": user_data.name,
         "email": user_data.email,
-        "password_hash": get_password_hash(user_data.password),
+        "password_hash": get_password_hash(pwd_context, user_data.password),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.users.insert_one(user_doc)
     
     # Create token
-    token = create_access_token({"sub": user_id})
+    token = create_access_token({"sub": user_id}, request.app.state.settings.jwt_secret_key)
     user = User(id=user_id, name=user_data.name, email=user_data.email, created_at=user_doc["created_at"])
     return TokenResponse(token=token, user=user)
 
 @api_router.post("/auth/login", response_model=TokenResponse)
-async def login(credentials: UserLogin):
+async def login(
+    credentials: UserLogin,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    pwd_context: CryptContext = Depends(get_pwd_context)
+):
     user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user_doc or not verify_password(credentials.password, user_doc["password_hash"]):
+    if not user_doc or not verify_password(pwd_context, credentials.password, user_doc["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    token = create_access_token({"sub": user_doc["id"]})
+    token = create_access_token({"sub": user_doc["id"]}, request.app.state.settings.jwt_secret_key)
     user = User(
         id=user_doc["id"],
         name=user_doc["name"],
@@ -169,18 +669,37 @@ async def login(credentials: UserLogin):
 
 # Expense Routes
 @api_router.post("/expenses", response_model=Expense, status_code=status.HTTP_201_CREATED)
-async def create_expense(expense_data: ExpenseCreate, user_id: str = Depends(get_current_user)):
+async def create_expense(
+    expense_data: ExpenseCreate,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store),
+    categories: CategoryDictionary = Depends(get_categories),
+    ingest_writer: Optional[GroupCommitWriter] = Depends(get_ingest_writer)
+):
+    category = await categories.resolve(user_id, expense_data.category)
     expense_id = str(uuid.uuid4())
     expense_doc = {
         "id": expense_id,
         "user_id": user_id,
         "amount": expense_data.amount,
-        "category": expense_data.category,
+        "category": category["name"],
+        "category_id": category["id"],
         "description": expense_data.description,
         "date": expense_data.date,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.expenses.insert_one(expense_doc)
+    expense_doc["updated_at"] = expense_doc["created_at"]
+    if ingest_writer:
+        # The writer draws the version and records the totals for the whole batch
+        await ingest_writer.submit(expense_doc)
+        return Expense(**expense_doc)
+
+    async with reserve_versions(db, user_id) as version:
+        expense_doc["version"] = version
+        await store.insert(expense_doc)
+    await categories.record(user_id, expense_doc)
+    await record_expense_stats(db, user_id, expense_doc)
     return Expense(**expense_doc)
 
 @api_router.get("/expenses", response_model=List[Expense])
@@ -188,50 +707,155 @@ async def get_expenses(
     user_id: str = Depends(get_current_user),
     category: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store),
+    categories: CategoryDictionary = Depends(get_categories)
 ):
-    query = {"user_id": user_id}
+    category_id = None
     if category:
-        query["category"] = category
-    if start_date:
-        query.setdefault("date", {})["$gte"] = start_date
-    if end_date:
-        query.setdefault("date", {})["$lte"] = end_date
-    
-    expenses = await db.expenses.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
-    return [Expense(**exp) for exp in expenses]
+        entry = await categories.lookup(user_id, category)
+        if not entry:
+            return []
+        category_id = entry["id"]
+    expenses = await store.find(user_id, category_id, start_date, end_date, limit=1000)
+    expenses.extend(await expand_recurring(db, user_id, category_id, start_date, end_date))
+    expenses.sort(key=lambda exp: exp["date"], reverse=True)
+    return [Expense(**exp) for exp in expenses[:1000]]
+
+@api_router.get("/expenses/changes", response_model=ExpenseChanges)
+async def get_expense_changes(
+    user_id: str = Depends(get_current_user),
+    since: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store)
+):
+    """
+    Return expenses changed and deleted since `since`, plus the token to
+    pass next time. Without a token the full set is returned once, after
+    which a refresh costs O(changes) instead of O(history).
+    """
+    today = datetime.now(timezone.utc).date().isoformat()
+    since_version, synced_on = decode_sync_token(since) if since else (0, None)
+
+    # Every version up to the watermark has committed before the reads
+    # below. Rows above it may be sent again next time, but none is skipped
+    # because a write with a lower version landed late.
+    watermark = await sync_watermark(db, user_id)
+    changes = await store.changed_since(user_id, since_version)
+    deleted, deleted_rules = [], []
+    if since:
+        tombstones = await db.expense_tombstones.find(
+            {"user_id": user_id, "version": {"$gt": since_version}},
+            {"_id": 0}
+        ).to_list(None)
+        deleted = [t["id"] for t in tombstones if "id" in t]
+        deleted_rules = [t["rule_id"] for t in tombstones if "rule_id" in t]
+
+    # Occurrences of new rules are all new; for older rules only the days
+    # that passed since the last sync can have produced new occurrences
+    rules = await db.recurring_expenses.find({"user_id": user_id}, {"_id": 0}).to_list(None)
+    for rule in rules:
+        if since and rule.get("version", 0) <= since_version:
+            start = (date.fromisoformat(synced_on) + timedelta(days=1)).isoformat()
+            changes.extend(expand_rule(rule, start, today))
+        else:
+            changes.extend(expand_rule(rule, end_date=today))
+
+    return ExpenseChanges(
+        changes=[Expense(**exp) for exp in changes],
+        deleted=deleted,
+        deleted_rules=deleted_rules,
+        token=encode_sync_token(max(since_version, watermark), today)
+    )
 
 @api_router.get("/expenses/{expense_id}", response_model=Expense)
-async def get_expense(expense_id: str, user_id: str = Depends(get_current_user)):
-    expense = await db.expenses.find_one({"id": expense_id, "user_id": user_id}, {"_id": 0})
+async def get_expense(
+    expense_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store)
+):
+    expense = await store.get(user_id, expense_id)
+    if not expense:
+        expense = await find_occurrence(db, user_id, expense_id)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     return Expense(**expense)
 
 @api_router.put("/expenses/{expense_id}", response_model=Expense)
-async def update_expense(expense_id: str, expense_data: ExpenseCreate, user_id: str = Depends(get_current_user)):
-    result = await db.expenses.update_one(
-        {"id": expense_id, "user_id": user_id},
-        {"$set": expense_data.model_dump()}
-    )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Expense not found")
+async def update_expense(
+    expense_id: str,
+    expense_data: ExpenseCreate,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store),
+    categories: CategoryDictionary = Depends(get_categories)
+):
+    category = await categories.resolve(user_id, expense_data.category)
+    changes = {
+        **expense_data.model_dump(),
+        "category": category["name"],
+        "category_id": category["id"],
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    async with reserve_versions(db, user_id) as version:
+        changes["version"] = version
+        previous_expense = await store.update(user_id, expense_id, changes)
+        if not previous_expense:
+            # Editing a recurring occurrence materializes it as a regular row
+            occurrence = await find_occurrence(db, user_id, expense_id)
+            if not occurrence:
+                raise HTTPException(status_code=404, detail="Expense not found")
+            expense_doc = {**occurrence, **changes}
+            try:
+                await store.insert(expense_doc)
+            except DuplicateKeyError:
+                # A concurrent edit materialized it first; apply this one on top
+                previous_expense = await store.update(user_id, expense_id, changes)
+                if not previous_expense:
+                    raise HTTPException(status_code=404, detail="Expense not found")
+            await add_rule_exception(db, user_id, occurrence)
+    if not previous_expense:
+        await categories.record(user_id, expense_doc)
+        await record_expense_stats(db, user_id, expense_doc)
+        return Expense(**expense_doc)
     
-    updated_expense = await db.expenses.find_one({"id": expense_id}, {"_id": 0})
+    updated_expense = {**previous_expense, **changes}
+    await categories.record(user_id, previous_expense, sign=-1)
+    await categories.record(user_id, updated_expense)
+    await record_expense_stats(db, user_id, previous_expense, sign=-1)
+    await record_expense_stats(db, user_id, updated_expense)
     return Expense(**updated_expense)
 
 @api_router.delete("/expenses/{expense_id}")
-async def delete_expense(expense_id: str, user_id: str = Depends(get_current_user)):
-    result = await db.expenses.delete_one({"id": expense_id, "user_id": user_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Expense not found")
+async def delete_expense(
+    expense_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store),
+    categories: CategoryDictionary = Depends(get_categories)
+):
+    deleted_expense = await store.delete(user_id, expense_id)
+    if not deleted_expense:
+        occurrence = await find_occurrence(db, user_id, expense_id)
+        if not occurrence:
+            raise HTTPException(status_code=404, detail="Expense not found")
+        await add_rule_exception(db, user_id, occurrence)
+        await record_tombstones(db, user_id, [expense_id])
+        return {"message": "Expense deleted successfully"}
+    await categories.record(user_id, deleted_expense, sign=-1)
+    await record_expense_stats(db, user_id, deleted_expense, sign=-1)
+    await record_tombstones(db, user_id, [expense_id])
     return {"message": "Expense deleted successfully"}
 
 @api_router.get("/expenses/export/csv")
 async def export_expenses_csv(
     month: int,
     year: int,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store)
 ):
     """
     Export expenses for a specific month/year as CSV file
@@ -246,25 +870,27 @@ async def export_expenses_csv(
         next_month = f"{year}-{month + 1:02d}-01"
     
     # Query expenses for the month
-    query = {
-        "user_id": user_id,
-        "date": {
-            "$gte": start_date,
-            "$lt": next_month
-        }
-    }
-    
-    expenses = await db.expenses.find(query, {"_id": 0}).sort("date", 1).to_list(10000)
+    expenses = await store.find(
+        user_id,
+        start_date=start_date,
+        end_date=next_month,
+        end_exclusive=True,
+        descending=False,
+        limit=10000
+    )
+    last_day = (date.fromisoformat(next_month) - timedelta(days=1)).isoformat()
+    expenses.extend(await expand_recurring(db, user_id, start_date=start_date, end_date=last_day))
+    expenses.sort(key=lambda exp: exp["date"])
     
-    # Create CSV in memory
-    output = io.StringIO()
-    if expenses:
-        # Write CSV with all fields
+    def csv_chunks():
+        # Yield the CSV a few hundred rows at a time so the response (and
+        # its compression) streams instead of being built up in memory
         fieldnames = ['id', 'date', 'description', 'category', 'amount', 'created_at']
+        output = io.StringIO()
         writer = csv.DictWriter(output, fieldnames=fieldnames)
         writer.writeheader()
         
-        for expense in expenses:
+        for index, expense in enumerate(expenses, start=1):
             writer.writerow({
                 'id': expense.get('id', ''),
                 'date': expense.get('date', ''),
@@ -273,17 +899,17 @@ async def export_expenses_csv(
                 'amount': expense.get('amount', 0),
                 'created_at': expense.get('created_at', '')
             })
-    else:
-        # Write empty CSV with headers
-        writer = csv.writer(output)
-        writer.writerow(['id', 'date', 'description', 'category', 'amount', 'created_at'])
+            if index % CSV_CHUNK_ROWS == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
     
     # Prepare response
-    output.seek(0)
     filename = f"expenses_{year}_{month:02d}.csv"
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        csv_chunks(),
         media_type="text/csv",
         headers={
             "Content-Disposition": f"attachment; filename={filename}"
@@ -291,26 +917,88 @@ async def export_expenses_csv(
     )
 
 
+# Recurring Expense Routes
+@api_router.post("/recurring", response_model=RecurringExpense, status_code=status.HTTP_201_CREATED)
+async def create_recurring_expense(
+    rule_data: RecurringExpenseCreate,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    categories: CategoryDictionary = Depends(get_categories)
+):
+    """
+    Store a recurring expense rule once. Its occurrences are expanded at
+    query time and only written to expense storage when one is edited.
+    """
+    category = await categories.resolve(user_id, rule_data.category)
+    rule_doc = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        **rule_data.model_dump(),
+        "category": category["name"],
+        "category_id": category["id"],
+        "exceptions": [],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    async with reserve_versions(db, user_id) as version:
+        rule_doc["version"] = version
+        await db.recurring_expenses.insert_one(rule_doc)
+    await invalidate_forecast(db, user_id)
+    return RecurringExpense(**rule_doc)
+
+@api_router.get("/recurring", response_model=List[RecurringExpense])
+async def get_recurring_expenses(
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    rules = await db.recurring_expenses.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
+    return [RecurringExpense(**rule) for rule in rules]
+
+@api_router.delete("/recurring/{rule_id}")
+async def delete_recurring_expense(
+    rule_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Delete a rule together with its unedited occurrences. Occurrences that
+    were edited are regular expenses by now and are kept. Synced clients
+    get a single rule-level tombstone rather than one per occurrence.
+    """
+    rule = await db.recurring_expenses.find_one_and_delete(
+        {"id": rule_id, "user_id": user_id},
+        projection={"_id": 0}
+    )
+    if not rule:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    await record_rule_tombstone(db, user_id, rule_id)
+    await invalidate_forecast(db, user_id)
+    return {"message": "Recurring expense deleted successfully"}
+
 # Analytics Routes
 @api_router.get("/analytics/summary", response_model=AnalyticsSummary)
 async def get_analytics_summary(
     user_id: str = Depends(get_current_user),
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store),
+    categories: CategoryDictionary = Depends(get_categories)
 ):
-    query = {"user_id": user_id}
-    if start_date:
-        query.setdefault("date", {})["$gte"] = start_date
-    if end_date:
-        query.setdefault("date", {})["$lte"] = end_date
-    
-    expenses = await db.expenses.find(query, {"_id": 0}).to_list(10000)
-    
-    total_expenses = sum(exp["amount"] for exp in expenses)
-    expense_count = len(expenses)
+    expenses = await expand_recurring(db, user_id, start_date=start_date, end_date=end_date)
+    category_map = {}
+    monthly_map = {}
+    if start_date or end_date:
+        expenses.extend(await store.find(user_id, start_date=start_date, end_date=end_date, limit=10000))
+    else:
+        # Whole history: start from the running totals instead of reading
+        # every expense
+        for cat in await categories.list(user_id):
+            if cat["count"] > 0:
+                category_map[cat["name"]] = {"category": cat["name"], "total": cat["total"], "count": cat["count"]}
+        for row in await store.monthly_category_totals(user_id):
+            monthly_map[row["month"]] = monthly_map.get(row["month"], 0) + row["total"]
     
     # Group by category
-    category_map = {}
     for exp in expenses:
         cat = exp["category"]
         if cat not in category_map:
@@ -318,10 +1006,9 @@ async def get_analytics_summary(
         category_map[cat]["total"] += exp["amount"]
         category_map[cat]["count"] += 1
     
-    categories = [CategorySummary(**cat) for cat in category_map.values()]
+    category_summaries = [CategorySummary(**cat) for cat in category_map.values()]
     
-    # Monthly trend (last 6 months)
-    monthly_map = {}
+    # Monthly trend
     for exp in expenses:
         month_key = exp["date"][:7]  # YYYY-MM
         if month_key not in monthly_map:
@@ -331,19 +1018,78 @@ async def get_analytics_summary(
     monthly_trend = [{"month": k, "amount": v} for k, v in sorted(monthly_map.items())]
     
     return AnalyticsSummary(
-        total_expenses=total_expenses,
-        expense_count=expense_count,
-        categories=categories,
+        total_expenses=sum(cat.total for cat in category_summaries),
+        expense_count=sum(cat.count for cat in category_summaries),
+        categories=category_summaries,
         monthly_trend=monthly_trend
     )
 
+@api_router.get("/analytics/forecast", response_model=SpendingForecast)
+async def get_spending_forecast(
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store)
+):
+    return await compute_forecast(db, store, user_id)
+
+async def compute_forecast(db: AsyncIOMotorDatabase, store: ArchivingExpenseStore, user_id: str) -> SpendingForecast:
+    """
+    Project month-end spend per category and overall. Past months are
+    summarised by cached, exponentially smoothed levels; the current month
+    is read from the running totals, so this never scans raw expenses.
+    """
+    today = datetime.now(timezone.utc).date()
+    current_month = month_key(today.isoformat())
+    levels = await load_forecast_levels(db, store, user_id, current_month)
+
+    current_stats = await db.forecast_stats.find(
+        {"user_id": user_id, "month": current_month},
+        {"_id": 0}
+    ).to_list(None)
+    spent_map = {row["category"]: row["total"] for row in current_stats if row["count"] > 0}
+    for occ in await expand_recurring(db, user_id, start_date=f"{current_month}-01"):
+        spent_map[occ["category"]] = spent_map.get(occ["category"], 0) + occ["amount"]
+
+    total_days = days_in_month(current_month)
+    remaining_fraction = (total_days - today.day) / total_days
+
+    categories = []
+    for cat in sorted(set(levels) | set(spent_map)):
+        spent = spent_map.get(cat, 0)
+        if cat in levels:
+            projected = spent + levels[cat] * remaining_fraction
+        else:
+            # No history yet: extrapolate the current month's run rate
+            projected = spent * total_days / today.day
+        categories.append(CategoryForecast(
+            category=cat,
+            spent_to_date=round(spent, 2),
+            projected_total=round(projected, 2)
+        ))
+
+    return SpendingForecast(
+        month=current_month,
+        days_elapsed=today.day,
+        days_in_month=total_days,
+        spent_to_date=round(sum(c.spent_to_date for c in categories), 2),
+        projected_total=round(sum(c.projected_total for c in categories), 2),
+        categories=categories
+    )
+
 # Budget Routes
 @api_router.post("/budget", response_model=Budget)
-async def create_budget(budget_data: BudgetCreate, user_id: str = Depends(get_current_user)):
+async def create_budget(
+    budget_data: BudgetCreate,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    categories: CategoryDictionary = Depends(get_categories)
+):
+    category = await categories.resolve(user_id, budget_data.category)
+
     # Check if budget already exists
     existing = await db.budgets.find_one({
         "user_id": user_id,
-        "category": budget_data.category,
+        "category": category["name"],
         "month": budget_data.month,
         "year": budget_data.year
     }, {"_id": 0})
@@ -362,7 +1108,8 @@ async def create_budget(budget_data: BudgetCreate, user_id: str = Depends(get_cu
     budget_doc = {
         "id": budget_id,
         "user_id": user_id,
-        "category": budget_data.category,
+        "category": category["name"],
+        "category_id": category["id"],
         "monthly_limit": budget_data.monthly_limit,
         "month": budget_data.month,
         "year": budget_data.year
@@ -371,26 +1118,191 @@ async def create_budget(budget_data: BudgetCreate, user_id: str = Depends(get_cu
     return Budget(**budget_doc)
 
 @api_router.get("/budget", response_model=List[Budget])
-async def get_budgets(user_id: str = Depends(get_current_user)):
+async def get_budgets(user_id: str = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
     budgets = await db.budgets.find({"user_id": user_id}, {"_id": 0}).to_list(100)
     return [Budget(**b) for b in budgets]
 
-app.include_router(api_router)
+# Dashboard Routes
+@api_router.get("/dashboard", response_model=DashboardData)
+async def get_dashboard(
+    user_id: str = Depends(get_current_user),
+    recent: int = Query(5, ge=1, le=50),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    store: ArchivingExpenseStore = Depends(get_store),
+    categories: CategoryDictionary = Depends(get_categories)
+):
+    """
+    Everything the Dashboard page draws in one request: the monthly trend,
+    the most recent expenses and this month's budget status come from a
+    single $facet pass over the user's expenses (or the bucket totals when
+    the bucketed layout is in use); the category breakdown is read from the
+    category dictionary's running totals.
+    """
+    today = datetime.now(timezone.utc).date()
+    current_month = month_key(today.isoformat())
+    month_start = f"{current_month}-01"
+    next_month_start = f"{shift_month(current_month, 1)}-01"
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    facets, category_rows, occurrences, budgets, forecast = await asyncio.gather(
+        store.dashboard_facets(user_id, recent, month_start, next_month_start),
+        categories.list(user_id),
+        expand_recurring(db, user_id),
+        db.budgets.find(
+            {"user_id": user_id, "month": today.month, "year": today.year},
+            {"_id": 0}
+        ).to_list(100),
+        compute_forecast(db, store, user_id)
+    )
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+    category_map = {
+        row["name"]: {"category": row["name"], "total": row["total"], "count": row["count"]}
+        for row in category_rows
+        if row["count"] > 0
+    }
+    monthly_map = {row["_id"]: row["amount"] for row in facets["monthly"]}
+    spent_map = {row["_id"]: row["spent"] for row in facets["current_month"]}
+    recent_expenses = facets["recent"]
+
+    # Recurring occurrences are not stored, so fold them in here
+    for occ in occurrences:
+        cat = category_map.setdefault(occ["category"], {"category": occ["category"], "total": 0, "count": 0})
+        cat["total"] += occ["amount"]
+        cat["count"] += 1
+        monthly_map[month_key(occ["date"])] = monthly_map.get(month_key(occ["date"]), 0) + occ["amount"]
+        if occ["date"] >= month_start:
+            spent_map[occ["category"]] = spent_map.get(occ["category"], 0) + occ["amount"]
+    recent_expenses = sorted(
+        recent_expenses + occurrences, key=lambda exp: exp["date"], reverse=True
+    )[:recent]
+
+    category_summaries = [CategorySummary(**cat) for cat in category_map.values()]
+    summary = AnalyticsSummary(
+        total_expenses=sum(cat.total for cat in category_summaries),
+        expense_count=sum(cat.count for cat in category_summaries),
+        categories=category_summaries,
+        monthly_trend=[{"month": k, "amount": v} for k, v in sorted(monthly_map.items())]
+    )
+    budget_status = [
+        BudgetStatus(
+            category=b["category"],
+            monthly_limit=b["monthly_limit"],
+            spent=spent_map.get(b["category"], 0),
+            remaining=b["monthly_limit"] - spent_map.get(b["category"], 0)
+        )
+        for b in budgets
+    ]
+
+    return DashboardData(
+        summary=summary,
+        recent_expenses=[Expense(**exp) for exp in recent_expenses],
+        budgets=budget_status,
+        forecast=forecast
+    )
+
+# Category Routes
+@api_router.get("/categories", response_model=List[Category])
+async def get_category_list(
+    user_id: str = Depends(get_current_user),
+    categories: CategoryDictionary = Depends(get_categories)
+):
+    """
+    The user's categories with their running totals and counts of stored
+    expenses (recurring occurrences that were never edited are not counted).
+    """
+    return [Category(**cat) for cat in await categories.list(user_id)]
+
+# Metrics Routes (operational data: signed-in users only)
+@api_router.get("/metrics/compression", dependencies=[Depends(get_current_user)])
+async def get_compression_metrics():
+    return compression_metrics.snapshot()
+
+@api_router.get("/metrics/ingest", dependencies=[Depends(get_current_user)])
+async def get_ingest_metrics(ingest_writer: Optional[GroupCommitWriter] = Depends(get_ingest_writer)):
+    if not ingest_writer:
+        return {"enabled": False}
+    return {"enabled": True, "pending": ingest_writer.pending, **ingest_writer.metrics.snapshot()}
+
+@api_router.get("/metrics/startup", dependencies=[Depends(get_current_user)])
+async def get_startup_metrics(request: Request):
+    return startup_report(request.app)
+
+# App factory
+async def create_indexes(db: AsyncIOMotorDatabase, store: ArchivingExpenseStore, categories: CategoryDictionary):
+    await db.users.create_index("email", unique=True)
+    await db.users.create_index("id", unique=True)
+    await db.budgets.create_index([("user_id", 1), ("year", 1), ("month", 1), ("category", 1)])
+    await db.budgets.create_index("id", unique=True)
+    await db.forecast_stats.create_index(
+        [("user_id", 1), ("month", 1), ("category", 1)],
+        unique=True
+    )
+    await db.forecast_models.create_index("user_id", unique=True)
+    await db.recurring_expenses.create_index([("user_id", 1), ("start_date", 1)])
+    await db.recurring_expenses.create_index([("user_id", 1), ("id", 1)])
+    await store.create_indexes()
+    await categories.create_indexes()
+    await db.expense_tombstones.create_index([("user_id", 1), ("version", 1)])
+    await db.sync_counters.create_index("user_id", unique=True)
+
+def startup_report(app: FastAPI) -> dict:
+    """
+    Milliseconds spent building and starting the app. Import cost is
+    measured from outside the module, by startup_report.py.
+    """
+    timings = dict(app.state.startup_timings)
+    timings.update({f"init.{name}": seconds for name, seconds in app.state.resources.timings.items()})
+    return {name: round(seconds * 1000, 2) for name, seconds in timings.items()}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    resources = app.state.resources
+    started = time.perf_counter()
+    if app.state.settings.create_indexes:
+        await create_indexes(resources.db, resources.expense_store, resources.categories)
+    app.state.startup_timings["lifespan_startup"] = time.perf_counter() - started
+    logger.info(f"Startup timings (ms): {startup_report(app)}")
+    yield
+    await resources.close()
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Build a configured app. Nothing expensive happens here: the Mongo client
+    and password hasher are created on first use, and each app owns its own,
+    so several differently configured apps can live in one process.
+    """
+    started = time.perf_counter()
+    settings = settings or Settings.from_env()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.resources = AppResources(settings)
+    app.state.startup_timings = {}
+
+    app.include_router(api_router)
+
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.compression_level,
+        brotli_quality=settings.brotli_quality
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.state.startup_timings["create_app"] = time.perf_counter() - started
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def __getattr__(name: str):
+    # The default app is built from the environment when it is first asked
+    # for (`uvicorn server:app`), not when the module is imported. Prefer
+    # `uvicorn --factory server:create_app` in new deployments.
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,102 @@
+"""
+Measure worker cold start and check it against a budget.
+
+Imports the server in a fresh interpreter with `-X importtime` to break the
+import cost down by top-level package, then builds an app with
+create_app(), runs its lifespan startup (without index creation) and forces
+the lazily created dependencies, the way the first requests would.
+
+    python startup_report.py --budget-ms 1500
+
+Exits non-zero when the total goes over the budget, so it can gate a
+deploy or an autoscaling image build.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+
+def import_breakdown(top: int):
+    """
+    Cumulative import microseconds of each module server.py imports
+    directly, largest first, plus server.py's own module body.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    # importtime prints children before their parent, indented two spaces
+    # per level, so collect depth-one entries until their parent shows up
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative)))
+        elif depth == 0:
+            if name.strip() == "server":
+                children.append(("server (module body)", int(self_us)))
+                break
+            children = []
+    ranked = sorted(children, key=lambda item: item[1], reverse=True)
+    return ranked[:top]
+
+
+async def measure_app():
+    started = time.perf_counter()
+    import server
+    import_ms = (time.perf_counter() - started) * 1000
+
+    settings = server.Settings.from_env().model_copy(update={"create_indexes": False})
+    app = server.create_app(settings)
+    async with server.lifespan(app):
+        resources = app.state.resources
+        resources.expense_store
+        server.get_password_hash(resources.pwd_context, "startup-report")
+        report = server.startup_report(app)
+    report["import"] = round(import_ms, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)),
+        help="fail when import plus initialization takes longer than this"
+    )
+    parser.add_argument("--top", type=int, default=10, help="number of packages to list in the import breakdown")
+    args = parser.parse_args()
+
+    print("Import time of server.py and its direct imports (ms, fresh interpreter)")
+    for name, micros in import_breakdown(args.top):
+        print(f"  {name:<28}{micros / 1000:>10.1f}")
+
+    report = asyncio.run(measure_app())
+    total = sum(report.values())
+    print("\nStartup phases (ms)")
+    for name, ms in report.items():
+        print(f"  {name:<28}{ms:>10.1f}")
+    print(f"  {'total':<28}{total:>10.1f}  (budget {args.budget_ms:.0f})")
+
+    if total > args.budget_ms:
+        print(f"\nOver budget by {total - args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+"""
+Expense storage layouts.
+
+Route handlers go through an ExpenseStore instead of touching
+db.expenses directly, so the on-disk layout can be chosen per deployment:
+
+- FlatExpenseStore keeps one document per expense in db.expenses.
+- BucketedExpenseStore packs a user's expenses into one document per month
+  in db.expense_buckets, with the bucket's count, total and per-category
+  totals maintained on write. A bucket holds at most BUCKET_SIZE rows; a
+  busier month continues in further buckets. Range scans touch one
+  document per month instead of one per expense, and summaries only read
+  the totals.
+
+Both return plain expense dicts (without `_id`) with the same semantics.
+"""
+import asyncio
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+
+# Keeps buckets far below MongoDB's 16 MB document limit
+BUCKET_SIZE = 1000
+DELETE_CONCURRENCY = 100
+# IndexOptionsConflict, IndexKeySpecsConflict
+INDEX_CONFLICT_CODES = (85, 86)
+
+
+def _date_match(category_id: Optional[int], start_date: Optional[str], end_date: Optional[str],
+                end_exclusive: bool = False) -> dict:
+    match = {}
+    if category_id is not None:
+        match["category_id"] = category_id
+    if start_date:
+        match.setdefault("date", {})["$gte"] = start_date
+    if end_date:
+        match.setdefault("date", {})["$lt" if end_exclusive else "$lte"] = end_date
+    return match
+
+
+def matches_filters(expense: dict, category_id: Optional[int] = None, start_date: Optional[str] = None,
+                    end_date: Optional[str] = None, end_exclusive: bool = False) -> bool:
+    """In-process equivalent of the query built by _date_match."""
+    if category_id is not None and expense.get("category_id") != category_id:
+        return False
+    if start_date and expense["date"] < start_date:
+        return False
+    if end_date and (expense["date"] >= end_date if end_exclusive else expense["date"] > end_date):
+        return False
+    return True
+
+
+def category_totals(expenses: List[dict]) -> dict:
+    """Map each category to its [total amount, count] within `expenses`."""
+    totals = {}
+    for exp in expenses:
+        entry = totals.setdefault(exp["category"], [0, 0])
+        entry[0] += exp["amount"]
+        entry[1] += 1
+    return totals
+
+
+def _category_key(expense: dict) -> str:
+    if expense.get("category_id") is not None:
+        return str(expense["category_id"])
+    # Rows written before categories were normalized carry only a name, and
+    # field names cannot contain dots or start with "$"
+    return "name:" + expense["category"].replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def _category_updates(expenses: List[dict], sign: int = 1) -> tuple:
+    """
+    $inc and $set operands applying `expenses` to a bucket's per-category
+    totals, a sub-document keyed by category id. A single update both
+    creates and adjusts an entry, so concurrent writers cannot race.
+    """
+    increments, names = {}, {}
+    for exp in expenses:
+        path = f"categories.{_category_key(exp)}"
+        increments[f"{path}.total"] = increments.get(f"{path}.total", 0) + sign * exp["amount"]
+        increments[f"{path}.count"] = increments.get(f"{path}.count", 0) + sign
+        names[f"{path}.name"] = exp["category"]
+    return increments, names
+
+
+class FlatExpenseStore:
+    def __init__(self, db):
+        self.collection = db.expenses
+
+    async def create_indexes(self):
+        await self.collection.create_index([("user_id", 1), ("date", -1)])
+        await self.collection.create_index([("user_id", 1), ("version", 1)])
+        try:
+            await self.collection.create_index([("user_id", 1), ("id", 1)], unique=True)
+        except OperationFailure as exc:
+            if exc.code not in INDEX_CONFLICT_CODES:
+                raise
+            # Deployments from before the index was unique
+            await self.collection.drop_index([("user_id", 1), ("id", 1)])
+            await self.collection.create_index([("user_id", 1), ("id", 1)], unique=True)
+        await self.collection.create_index([("user_id", 1), ("category_id", 1), ("date", -1)])
+
+    async def insert(self, expense: dict):
+        await self.collection.insert_one(dict(expense))
+
+    async def insert_many(self, expenses: List[dict]):
+        if expenses:
+            await self.collection.insert_many([dict(exp) for exp in expenses], ordered=False)
+
+    async def find(self, user_id: str, category_id: Optional[int] = None, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, end_exclusive: bool = False,
+                   descending: bool = True, limit: Optional[int] = None) -> List[dict]:
+        query = {"user_id": user_id, **_date_match(category_id, start_date, end_date, end_exclusive)}
+        cursor = self.collection.find(query, {"_id": 0}).sort("date", -1 if descending else 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(None)
+
+    async def get(self, user_id: str, expense_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": expense_id, "user_id": user_id}, {"_id": 0})
+
+    async def update(self, user_id: str, expense_id: str, changes: dict) -> Optional[dict]:
+        """Apply `changes` and return the expense as it was before."""
+        return await self.collection.find_one_and_update(
+            {"id": expense_id, "user_id": user_id},
+            {"$set": changes},
+            projection={"_id": 0}
+        )
+
+    async def delete(self, user_id: str, expense_id: str) -> Optional[dict]:
+        return await self.collection.find_one_and_delete(
+            {"id": expense_id, "user_id": user_id},
+            projection={"_id": 0}
+        )
+
+    async def delete_many(self, user_id: str, expenses: List[dict]) -> List[dict]:
+        """
+        Delete the given rows unless they changed (their `version` moved on)
+        or went away since they were read; returns the rows deleted.
+        """
+        deleted = []
+        for offset in range(0, len(expenses), DELETE_CONCURRENCY):
+            # One guarded delete per row: a bulk delete only reports a count,
+            # not which rows it removed
+            results = await asyncio.gather(*(
+                self.collection.find_one_and_delete(
+                    {"id": exp["id"], "user_id": user_id, "version": exp.get("version")},
+                    projection={"_id": 0}
+                )
+                for exp in expenses[offset:offset + DELETE_CONCURRENCY]
+            ))
+            deleted.extend(row for row in results if row)
+        return deleted
+
+    async def user_ids(self) -> List[str]:
+        return await self.collection.distinct("user_id")
+
+    async def changed_since(self, user_id: str, version: int) -> List[dict]:
+        query = {"user_id": user_id}
+        if version:
+            query["version"] = {"$gt": version}
+        return await self.collection.find(query, {"_id": 0}).to_list(None)
+
+    async def monthly_category_totals(self, user_id: str) -> List[dict]:
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": {"month": {"$substrCP": ["$date", 0, 7]}, "category": "$category"},
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        return [
+            {"month": row["_id"]["month"], "category": row["_id"]["category"],
+             "total": row["total"], "count": row["count"]}
+            async for row in self.collection.aggregate(pipeline)
+        ]
+
+    async def dashboard_facets(self, user_id: str, recent: int, month_start: str, next_month_start: str) -> dict:
+        """
+        Monthly totals and the current month's spend per category from a
+        single $facet pass, plus the `recent` newest expenses. Those are read
+        through the (user_id, date) index: a $sort inside $facet cannot use
+        an index and would sort every row in memory.
+        """
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$facet": {
+                "monthly": [
+                    {"$group": {"_id": {"$substrCP": ["$date", 0, 7]}, "amount": {"$sum": "$amount"}}}
+                ],
+                "current_month": [
+                    {"$match": {"date": {"$gte": month_start, "$lt": next_month_start}}},
+                    {"$group": {"_id": "$category", "spent": {"$sum": "$amount"}}}
+                ]
+            }}
+        ]
+        facets = await self.collection.aggregate(pipeline).next()
+        facets["recent"] = await self.find(user_id, limit=recent)
+        return facets
+
+
+class BucketedExpenseStore:
+    def __init__(self, db):
+        self.collection = db.expense_buckets
+
+    async def create_indexes(self):
+        await self.collection.create_index([("user_id", 1), ("month", -1), ("seq", 1)], unique=True)
+        await self.collection.create_index([("user_id", 1), ("expenses.id", 1)])
+        await self.collection.create_index([("user_id", 1), ("max_version", 1)])
+
+    @staticmethod
+    def _month(expense: dict) -> str:
+        return expense["date"][:7]  # YYYY-MM
+
+    async def _push(self, user_id: str, month: str, rows: List[dict]):
+        """
+        Append `rows` (at most BUCKET_SIZE) to a bucket of `month` with room
+        for all of them, starting the month's next bucket when none has.
+        """
+        increments, names = _category_updates(rows)
+        update = {
+            "$push": {"expenses": {"$each": rows}},
+            "$inc": {"count": len(rows), "total": sum(exp["amount"] for exp in rows), **increments},
+            "$set": names,
+            "$max": {"max_version": max(exp.get("version", 0) for exp in rows)}
+        }
+        room = {"count": {"$lte": BUCKET_SIZE - len(rows)}}
+        result = await self.collection.update_one({"user_id": user_id, "month": month, **room}, update)
+        if result.matched_count:
+            return
+
+        seq = await self.collection.count_documents({"user_id": user_id, "month": month})
+        while True:
+            try:
+                await self.collection.update_one(
+                    {"user_id": user_id, "month": month, "seq": seq, **room},
+                    update,
+                    upsert=True
+                )
+                return
+            except DuplicateKeyError:
+                # That bucket exists but is full, or another writer just filled it
+                seq += 1
+
+    async def _add(self, user_id: str, expense: dict):
+        await self._push(user_id, self._month(expense), [expense])
+
+    @staticmethod
+    def _unchanged(expense: dict) -> dict:
+        """Bucket filter matching only while `expense` is stored at the version read."""
+        return {"expenses": {"$elemMatch": {"id": expense["id"], "version": expense.get("version")}}}
+
+    async def _remove(self, user_id: str, expense: dict) -> bool:
+        """Pull `expense` unless it changed or went away since it was read."""
+        increments, _ = _category_updates([expense], sign=-1)
+        result = await self.collection.update_one(
+            {"user_id": user_id, **self._unchanged(expense)},
+            {
+                "$pull": {"expenses": {"id": expense["id"]}},
+                "$inc": {"count": -1, "total": -expense["amount"], **increments}
+            }
+        )
+        return bool(result.matched_count)
+
+    async def insert(self, expense: dict):
+        """
+        Store one expense, raising DuplicateKeyError if its id is already
+        stored, as the flat layout's unique index does. Rows inside buckets
+        cannot be indexed uniquely, so the check is a lookup before the push.
+        """
+        if await self.collection.find_one({"user_id": expense["user_id"], "expenses.id": expense["id"]}, {"_id": 1}):
+            raise DuplicateKeyError(f"expense {expense['id']} already exists")
+        await self._add(expense["user_id"], dict(expense))
+
+    async def insert_many(self, expenses: List[dict]):
+        """
+        Write a batch with one bucket update per (user, month) it touches.
+        Like an unordered insert_many, a failed update does not stop the
+        rest; the rows it held are reported in a BulkWriteError.
+        """
+        groups = {}
+        for index, exp in enumerate(expenses):
+            groups.setdefault((exp["user_id"], self._month(exp)), []).append((index, dict(exp)))
+
+        write_errors = []
+        for (user_id, month), rows in groups.items():
+            for offset in range(0, len(rows), BUCKET_SIZE):
+                chunk = rows[offset:offset + BUCKET_SIZE]
+                try:
+                    await self._push(user_id, month, [exp for _, exp in chunk])
+                except PyMongoError as exc:
+                    # Each push is a single-document update, so none of its rows landed
+                    write_errors.extend(
+                        {"index": index, "code": getattr(exc, "code", None), "errmsg": str(exc)}
+                        for index, _ in chunk
+                    )
+        if write_errors:
+            raise BulkWriteError({
+                "writeErrors": sorted(write_errors, key=lambda error: error["index"]),
+                "nInserted": len(expenses) - len(write_errors)
+            })
+
+    async def _scan(self, user_id: str, bucket_match: dict, row_filter=None,
+                    descending: bool = True, limit: Optional[int] = None) -> List[dict]:
+        """
+        Walk the matching buckets newest (or oldest) month first. Months do
+        not overlap, so once `limit` rows are collected no later month can
+        contribute and the walk stops early. A month's rows are sorted
+        together, as they can span several buckets.
+        """
+        cursor = self.collection.find(
+            {"user_id": user_id, **bucket_match},
+            {"_id": 0, "month": 1, "expenses": 1}
+        ).sort("month", -1 if descending else 1)
+
+        rows, month_rows, month = [], [], None
+        async for bucket in cursor:
+            if bucket["month"] != month:
+                rows.extend(sorted(month_rows, key=lambda exp: exp["date"], reverse=descending))
+                month_rows, month = [], bucket["month"]
+                if limit and len(rows) >= limit:
+                    break
+            month_rows.extend(exp for exp in bucket.get("expenses", []) if not row_filter or row_filter(exp))
+        rows.extend(sorted(month_rows, key=lambda exp: exp["date"], reverse=descending))
+        return rows[:limit] if limit else rows
+
+    async def find(self, user_id: str, category_id: Optional[int] = None, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, end_exclusive: bool = False,
+                   descending: bool = True, limit: Optional[int] = None) -> List[dict]:
+        bucket_match = {}
+        if start_date:
+            bucket_match.setdefault("month", {})["$gte"] = start_date[:7]
+        if end_date:
+            bucket_match.setdefault("month", {})["$lte"] = end_date[:7]
+        if category_id is not None:
+            bucket_match["expenses.category_id"] = category_id
+
+        def row_filter(exp: dict) -> bool:
+            return matches_filters(exp, category_id, start_date, end_date, end_exclusive)
+
+        return await self._scan(user_id, bucket_match, row_filter, descending, limit)
+
+    async def get(self, user_id: str, expense_id: str) -> Optional[dict]:
+        bucket = await self.collection.find_one(
+            {"user_id": user_id, "expenses.id": expense_id},
+            {"_id": 0, "expenses": {"$elemMatch": {"id": expense_id}}}
+        )
+        return bucket["expenses"][0] if bucket else None
+
+    async def update(self, user_id: str, expense_id: str, changes: dict) -> Optional[dict]:
+        """
+        Apply `changes` and return the expense as it was before. The write
+        only matches the row at the version read, so a concurrent update
+        or delete makes it read the row again rather than apply to a stale
+        copy and skew the bucket totals.
+        """
+        while True:
+            previous = await self.get(user_id, expense_id)
+            if not previous:
+                return None
+            updated = {**previous, **changes}
+            if self._month(updated) != self._month(previous):
+                if await self._remove(user_id, previous):
+                    await self._add(user_id, updated)
+                    return previous
+                continue
+
+            removed, _ = _category_updates([previous], sign=-1)
+            added, names = _category_updates([updated])
+            increments = {path: removed.get(path, 0) + added.get(path, 0) for path in {**removed, **added}}
+            result = await self.collection.update_one(
+                {"user_id": user_id, "month": self._month(previous), **self._unchanged(previous)},
+                {
+                    "$set": {"expenses.$": updated, **names},
+                    "$inc": {"total": updated["amount"] - previous["amount"], **increments},
+                    "$max": {"max_version": updated.get("version", 0)}
+                }
+            )
+            if result.matched_count:
+                return previous
+
+    async def delete(self, user_id: str, expense_id: str) -> Optional[dict]:
+        """Delete the expense and return it; None if it was not (or no longer) there."""
+        while True:
+            previous = await self.get(user_id, expense_id)
+            if not previous:
+                return None
+            if await self._remove(user_id, previous):
+                return previous
+
+    async def delete_many(self, user_id: str, expenses: List[dict]) -> List[dict]:
+        """
+        Delete the given rows unless they changed (their `version` moved on)
+        or went away since they were read; returns the rows deleted.
+        """
+        remaining = {exp["id"]: exp for exp in expenses}
+        deleted = []
+        while remaining:
+            buckets = await self.collection.find(
+                {"user_id": user_id, "expenses.id": {"$in": list(remaining)}},
+                {"expenses.id": 1, "expenses.version": 1}
+            ).to_list(None)
+            found = {exp["id"] for bucket in buckets for exp in bucket["expenses"]}
+            for expense_id in [expense_id for expense_id in remaining if expense_id not in found]:
+                del remaining[expense_id]
+
+            for bucket in buckets:
+                rows = []
+                for stored in bucket["expenses"]:
+                    expected = remaining.get(stored["id"])
+                    if expected is None:
+                        continue
+                    if stored.get("version") == expected.get("version"):
+                        rows.append(expected)
+                    else:
+                        del remaining[stored["id"]]
+                if not rows:
+                    continue
+                increments, _ = _category_updates(rows, sign=-1)
+                # Matches only while every row is still in this bucket at the
+                # version read; otherwise the rows are looked up again
+                result = await self.collection.update_one(
+                    {
+                        "_id": bucket["_id"],
+                        "expenses": {"$all": [
+                            {"$elemMatch": {"id": exp["id"], "version": exp.get("version")}} for exp in rows
+                        ]}
+                    },
+                    {
+                        "$pull": {"expenses": {"id": {"$in": [exp["id"] for exp in rows]}}},
+                        "$inc": {"count": -len(rows), "total": -sum(exp["amount"] for exp in rows), **increments}
+                    }
+                )
+                if result.matched_count:
+                    deleted.extend(rows)
+                    for exp in rows:
+                        del remaining[exp["id"]]
+        return deleted
+
+    async def user_ids(self) -> List[str]:
+        return await self.collection.distinct("user_id")
+
+    async def changed_since(self, user_id: str, version: int) -> List[dict]:
+        if not version:
+            return await self._scan(user_id, {})
+        return await self._scan(
+            user_id,
+            {"max_version": {"$gt": version}},
+            lambda exp: exp.get("version", 0) > version
+        )
+
+    async def monthly_category_totals(self, user_id: str) -> List[dict]:
+        # Reads only the precomputed per-bucket totals, never the expenses
+        totals = {}
+        async for bucket in self.collection.find({"user_id": user_id}, {"_id": 0, "month": 1, "categories": 1}):
+            for cat in bucket.get("categories", {}).values():
+                entry = totals.setdefault((bucket["month"], cat["name"]), [0, 0])
+                entry[0] += cat["total"]
+                entry[1] += cat["count"]
+        return [
+            {"month": month, "category": category, "total": total, "count": count}
+            for (month, category), (total, count) in totals.items()
+            if count > 0
+        ]
+
+    async def dashboard_facets(self, user_id: str, recent: int, month_start: str, next_month_start: str) -> dict:
+        totals = await self.monthly_category_totals(user_id)
+        monthly, current_month = {}, {}
+        for row in totals:
+            monthly[row["month"]] = monthly.get(row["month"], 0) + row["total"]
+            if month_start[:7] <= row["month"] < next_month_start[:7]:
+                current_month[row["category"]] = current_month.get(row["category"], 0) + row["total"]
+        return {
+            "monthly": [{"_id": month, "amount": amount} for month, amount in monthly.items()],
+            "recent": await self._scan(user_id, {}, limit=recent),
+            "current_month": [{"_id": cat, "spent": spent} for cat, spent in current_month.items()]
+        }
+
+
+EXPENSE_STORES = {
+    "flat": FlatExpenseStore,
+    "bucketed": BucketedExpenseStore,
+}
+
+
+def get_expense_store(db, layout: str = "flat"):
+    try:
+        return EXPENSE_STORES[layout](db)
+    except KeyError:
+        raise ValueError(f"Unknown expense storage layout: {layout}")
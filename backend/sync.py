@@ -0,0 +1,67 @@
+"""
+Per-user change versions for delta sync.
+
+Every write stamps the row (or its tombstone) with the next value of the
+user's sequence in db.sync_counters, and clients ask for everything after
+the last version they saw. Versions are handed out before the write that
+uses them commits, so each allocation is leased in the counter document
+until the write is done, and sync tokens never pass a version still in
+flight.
+"""
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from pymongo import ReturnDocument
+
+VERSION_LEASE_SECONDS = 60
+
+
+@asynccontextmanager
+async def reserve_versions(db, user_id: str, count: int = 1):
+    """
+    Allocate `count` consecutive values of the user's change sequence and
+    yield the first, leased until the block exits: a lower version can
+    commit after a higher one, so sync tokens stay below the oldest leased
+    version (see sync_watermark).
+    """
+    lease = f"leases.{uuid.uuid4()}"
+    counter = await db.sync_counters.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": {lease: {"at": time.time()}}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # The sequence only grows, so every version allocated next is above it
+    counter = await db.sync_counters.find_one_and_update(
+        {"user_id": user_id},
+        {"$inc": {"seq": count}, "$set": {f"{lease}.floor": counter.get("seq", 0) + 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    try:
+        yield counter["seq"] - count + 1
+    finally:
+        await db.sync_counters.update_one({"user_id": user_id}, {"$unset": {lease: ""}})
+
+
+async def sync_watermark(db, user_id: str) -> int:
+    """
+    Return the highest version at or below which every write has committed:
+    the counter value, capped below the oldest version still leased. Leases
+    older than VERSION_LEASE_SECONDS belong to writers that died; they are
+    ignored and cleared.
+    """
+    counter = await db.sync_counters.find_one({"user_id": user_id}, {"_id": 0}) or {}
+    horizon = time.time() - VERSION_LEASE_SECONDS
+    watermark = counter.get("seq", 0)
+    expired = {}
+    for lease_id, lease in counter.get("leases", {}).items():
+        if lease["at"] < horizon:
+            expired[f"leases.{lease_id}"] = ""
+        elif "floor" in lease:
+            # A lease without a floor has not drawn its versions yet; they
+            # will be above the counter value read here
+            watermark = min(watermark, lease["floor"] - 1)
+    if expired:
+        await db.sync_counters.update_one({"user_id": user_id}, {"$unset": expired})
+    return watermark
@@ -199,6 +199,226 @@ class ExpenseAPITester:
         )
         return success and 'total_expenses' in response and 'expense_count' in response
 
+    def test_spending_forecast(self):
+        """Test month-end spending forecast endpoint"""
+        success, response = self.run_test(
+            "Spending Forecast",
+            "GET",
+            "analytics/forecast",
+            200
+        )
+        return (success and 'projected_total' in response
+                and response.get('projected_total', 0) >= response.get('spent_to_date', 0))
+
+    def test_recurring_expenses(self):
+        """Test recurring rules expand lazily and materialize on edit"""
+        rule_data = {
+            "amount": 500.00,
+            "category": "Rent",
+            "description": "Monthly rent",
+            "frequency": "monthly",
+            "start_date": "2023-01-05",
+            "end_date": "2023-03-31"
+        }
+        success, rule = self.run_test(
+            "Create Recurring Expense",
+            "POST",
+            "recurring",
+            201,
+            data=rule_data
+        )
+        if not success or 'id' not in rule:
+            return False
+
+        success, response = self.run_test(
+            "Expand Recurring Occurrences",
+            "GET",
+            "expenses?start_date=2023-01-01&end_date=2023-12-31&category=Rent",
+            200
+        )
+        occurrences = [exp for exp in response if exp.get('recurring_id') == rule['id']]
+        if not success or len(occurrences) != 3:
+            print(f"❌ Expected 3 occurrences, got {len(occurrences)}")
+            return False
+
+        # Editing an occurrence materializes it, deleting one skips it
+        edited_id = occurrences[0]['id']
+        success, response = self.run_test(
+            "Edit Recurring Occurrence",
+            "PUT",
+            f"expenses/{edited_id}",
+            200,
+            data={**{k: occurrences[0][k] for k in ('category', 'description', 'date')}, "amount": 550.00}
+        )
+        if not success or response.get('amount') != 550.00:
+            return False
+        success, _ = self.run_test(
+            "Delete Recurring Occurrence",
+            "DELETE",
+            f"expenses/{occurrences[1]['id']}",
+            200
+        )
+        if not success:
+            return False
+
+        success, response = self.run_test(
+            "Expand After Edit And Delete",
+            "GET",
+            "expenses?start_date=2023-01-01&end_date=2023-12-31&category=Rent",
+            200
+        )
+        amounts = sorted(exp['amount'] for exp in response if exp.get('recurring_id') == rule['id'])
+        _, synced = self.run_test(
+            "Sync Before Rule Delete",
+            "GET",
+            "expenses/changes",
+            200
+        )
+        self.run_test(
+            "Delete Recurring Expense",
+            "DELETE",
+            f"recurring/{rule['id']}",
+            200
+        )
+        # One rule-level tombstone instead of one per past occurrence
+        success, delta = self.run_test(
+            "Sync After Rule Delete",
+            "GET",
+            f"expenses/changes?since={synced.get('token', '')}",
+            200
+        )
+        if not success or delta.get('deleted_rules') != [rule['id']] or delta.get('deleted') != []:
+            print(f"❌ Expected a single rule tombstone, got {delta}")
+            success = False
+        self.run_test(
+            "Delete Materialized Occurrence",
+            "DELETE",
+            f"expenses/{edited_id}",
+            200
+        )
+        return success and amounts == [500.00, 550.00]
+
+    def test_expense_changes(self):
+        """Test delta sync returns only changes and tombstones since a token"""
+        success, response = self.run_test(
+            "Full Expense Sync",
+            "GET",
+            "expenses/changes",
+            200
+        )
+        if not success or 'token' not in response:
+            return False
+        token = response['token']
+
+        success, created = self.run_test(
+            "Create Expense For Sync",
+            "POST",
+            "expenses",
+            201,
+            data={"amount": 9.99, "category": "Food", "description": "Sync test", "date": "2024-02-01"}
+        )
+        if not success:
+            return False
+        success, response = self.run_test(
+            "Delta Sync After Create",
+            "GET",
+            f"expenses/changes?since={token}",
+            200
+        )
+        if not success or [exp['id'] for exp in response['changes']] != [created['id']]:
+            return False
+        token = response['token']
+
+        self.run_test(
+            "Delete Expense For Sync",
+            "DELETE",
+            f"expenses/{created['id']}",
+            200
+        )
+        success, response = self.run_test(
+            "Delta Sync After Delete",
+            "GET",
+            f"expenses/changes?since={token}",
+            200
+        )
+        return success and response['changes'] == [] and response['deleted'] == [created['id']]
+
+    def test_dashboard(self):
+        """Test consolidated dashboard endpoint"""
+        success, response = self.run_test(
+            "Dashboard",
+            "GET",
+            "dashboard?recent=5",
+            200
+        )
+        return (success and 'summary' in response and 'forecast' in response
+                and isinstance(response.get('budgets'), list)
+                and len(response.get('recent_expenses', [])) <= 5)
+
+    def test_response_compression(self):
+        """Test JSON responses above the threshold are compressed with the client's preferred encoding"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Response Compression...")
+        headers = {'Authorization': f'Bearer {self.token}'}
+        # Make sure the list is well above the 1 KB threshold
+        created = []
+        for n in range(20):
+            response = requests.post(
+                f"{self.base_url}/expenses",
+                json={"amount": 1.0 + n, "category": "Food", "description": f"Compression test {n} " + "x" * 80,
+                      "date": "2024-03-01"},
+                headers=headers
+            )
+            if response.status_code == 201:
+                created.append(response.json()['id'])
+        plain = requests.get(f"{self.base_url}/expenses", headers={**headers, 'Accept-Encoding': 'identity'})
+        gzipped = requests.get(f"{self.base_url}/expenses", headers={**headers, 'Accept-Encoding': 'gzip'})
+        # gzip is weighted higher than br here, so it must win
+        weighted = requests.get(f"{self.base_url}/expenses", headers={**headers, 'Accept-Encoding': 'br;q=0.1, gzip;q=1'})
+        for expense_id in created:
+            requests.delete(f"{self.base_url}/expenses/{expense_id}", headers=headers)
+
+        encodings = (gzipped.headers.get('Content-Encoding'), weighted.headers.get('Content-Encoding'))
+        if (plain.status_code == 200 and len(plain.content) > 1024 and plain.headers.get('Content-Encoding') is None
+                and encodings == ('gzip', 'gzip') and gzipped.json() == plain.json()):
+            self.tests_passed += 1
+            print(f"✅ Passed - {len(plain.content)} bytes, Content-Encoding: {encodings}")
+            return True
+        print(f"❌ Failed - Status: {plain.status_code}, {len(plain.content)} bytes, Content-Encoding: {encodings}")
+        return False
+
+    def test_startup_metrics(self):
+        """Test the startup timing report"""
+        success, response = self.run_test(
+            "Startup Metrics",
+            "GET",
+            "metrics/startup",
+            200
+        )
+        if not (success and 'create_app' in response and 'lifespan_startup' in response):
+            return False
+
+        original_token = self.token
+        self.token = None
+        unauthenticated, _ = self.run_test(
+            "Startup Metrics Without Token",
+            "GET",
+            "metrics/startup",
+            403
+        )
+        self.token = original_token
+        return unauthenticated
+
+    def test_ingest_metrics(self):
+        """Test the group-commit ingestion metrics"""
+        success, response = self.run_test(
+            "Ingest Metrics",
+            "GET",
+            "metrics/ingest",
+            200
+        )
+        return success and 'enabled' in response
+
     def test_category_filtering(self):
         """Test expense filtering by category"""
         success, response = self.run_test(
@@ -209,6 +429,26 @@ class ExpenseAPITester:
         )
         return success and isinstance(response, list)
 
+    def test_category_normalization(self):
+        """Test differently spelled category names share one category"""
+        success, response = self.run_test(
+            "Create Expense with Unnormalized Category",
+            "POST",
+            "expenses",
+            201,
+            data={"amount": 4.25, "category": "  fOOD ", "description": "Snack", "date": "2024-01-16"}
+        )
+        if not success or response.get('category') != 'Food':
+            return False
+        success, response = self.run_test(
+            "List Categories",
+            "GET",
+            "categories",
+            200
+        )
+        names = [cat['name'] for cat in response] if success else []
+        return [name.casefold() for name in names].count('food') == 1
+
     def test_date_filtering(self):
         """Test expense filtering by date range"""
         success, response = self.run_test(
@@ -511,7 +751,15 @@ def main():
         ("Get Single Expense", tester.test_get_single_expense),
         ("Update Expense", tester.test_update_expense),
         ("Analytics Summary", tester.test_analytics_summary),
+        ("Spending Forecast", tester.test_spending_forecast),
+        ("Recurring Expenses", tester.test_recurring_expenses),
+        ("Expense Delta Sync", tester.test_expense_changes),
+        ("Dashboard", tester.test_dashboard),
+        ("Response Compression", tester.test_response_compression),
+        ("Startup Metrics", tester.test_startup_metrics),
+        ("Ingest Metrics", tester.test_ingest_metrics),
         ("Category Filtering", tester.test_category_filtering),
+        ("Category Normalization", tester.test_category_normalization),
         ("Date Filtering", tester.test_date_filtering),
         ("Invalid Authentication", tester.test_invalid_auth),
         ("Delete Expense", tester.test_delete_expense),
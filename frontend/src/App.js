@@ -6,6 +6,7 @@ import { Toaster } from '@/components/ui/sonner';
 import Auth from '@/pages/Auth';
 import Dashboard from '@/pages/Dashboard';
 import Expenses from '@/pages/Expenses';
+import { clearExpenseCache } from '@/lib/expenseSync';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 export const API = `${BACKEND_URL}/api`;
@@ -38,6 +39,7 @@ function App() {
   }, []);
 
   const handleLogin = (token, userData) => {
+    clearExpenseCache();
     localStorage.setItem('token', token);
     localStorage.setItem('user', JSON.stringify(userData));
     setIsAuthenticated(true);
@@ -47,6 +49,7 @@ function App() {
   const handleLogout = () => {
     localStorage.removeItem('token');
     localStorage.removeItem('user');
+    clearExpenseCache();
     setIsAuthenticated(false);
     setUser(null);
   };
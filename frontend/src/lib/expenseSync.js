@@ -0,0 +1,56 @@
+import { api } from '../App';
+
+const STORAGE_KEY = 'expenseSync';
+
+const loadCache = () => {
+  try {
+    const cached = JSON.parse(localStorage.getItem(STORAGE_KEY));
+    if (cached && cached.token && cached.expenses) {
+      return cached;
+    }
+  } catch (error) {
+    // Corrupt cache, fall through to a full sync
+  }
+  return { token: null, expenses: {} };
+};
+
+const saveCache = (cache) => {
+  try {
+    localStorage.setItem(STORAGE_KEY, JSON.stringify(cache));
+  } catch (error) {
+    // Storage full, the next load does a full sync instead
+    localStorage.removeItem(STORAGE_KEY);
+  }
+};
+
+export const clearExpenseCache = () => {
+  localStorage.removeItem(STORAGE_KEY);
+};
+
+// Bring the local copy of the expense list up to date by applying only the
+// rows changed or deleted since the last sync. Returns the list newest first.
+export async function syncExpenses() {
+  const cache = loadCache();
+  const response = await api.get('/expenses/changes', {
+    params: cache.token ? { since: cache.token } : {}
+  });
+
+  const expenses = cache.token ? cache.expenses : {};
+  response.data.changes.forEach((expense) => {
+    expenses[expense.id] = expense;
+  });
+  response.data.deleted.forEach((id) => {
+    delete expenses[id];
+  });
+  // A deleted rule takes its unedited occurrences with it; edited ones
+  // were stored as regular expenses (with updated_at) and stay
+  const deletedRules = new Set(response.data.deleted_rules || []);
+  Object.values(expenses).forEach((expense) => {
+    if (deletedRules.has(expense.recurring_id) && !expense.updated_at) {
+      delete expenses[expense.id];
+    }
+  });
+  saveCache({ token: response.data.token, expenses });
+
+  return Object.values(expenses).sort((a, b) => b.date.localeCompare(a.date));
+}
@@ -10,6 +10,7 @@ import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { Wallet, Plus, TrendingUp, DollarSign, List, LogOut,IndianRupee } from 'lucide-react';
 import { PieChart, Pie, Cell, ResponsiveContainer, BarChart, Bar, XAxis, YAxis, Tooltip, Legend } from 'recharts';
+import { Progress } from '@/components/ui/progress';
 import DownloadCSV from '../components/DownloadCSV';
 
 const CATEGORIES = [
@@ -29,7 +30,9 @@ const COLORS = ['#2F5E41', '#D97706', '#E8F3E8', '#78716C', '#F59E0B', '#10B981'
 export default function Dashboard({ user, onLogout }) {
   const navigate = useNavigate();
   const [analytics, setAnalytics] = useState(null);
+  const [forecast, setForecast] = useState(null);
   const [recentExpenses, setRecentExpenses] = useState([]);
+  const [budgets, setBudgets] = useState([]);
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [expenseData, setExpenseData] = useState({
@@ -41,12 +44,11 @@ export default function Dashboard({ user, onLogout }) {
 
   const fetchData = async () => {
     try {
-      const [analyticsRes, expensesRes] = await Promise.all([
-        api.get('/analytics/summary'),
-        api.get('/expenses')
-      ]);
-      setAnalytics(analyticsRes.data);
-      setRecentExpenses(expensesRes.data.slice(0, 5));
+      const response = await api.get('/dashboard', { params: { recent: 5 } });
+      setAnalytics(response.data.summary);
+      setForecast(response.data.forecast);
+      setRecentExpenses(response.data.recent_expenses);
+      setBudgets(response.data.budgets);
     } catch (error) {
       toast.error('Failed to fetch data');
     } finally {
@@ -215,7 +217,7 @@ export default function Dashboard({ user, onLogout }) {
           </div>
         </div>
 
-        <div className="grid grid-cols-1 md:grid-cols-3 gap-6 mb-8">
+        <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6 mb-8">
           <Card className="shadow-sm hover:shadow-md transition-all duration-300 rounded-xl border-border hover-lift">
             <CardHeader className="flex flex-row items-center justify-between pb-2">
               <CardTitle className="text-sm font-medium text-muted-foreground">Total Expenses</CardTitle>
@@ -254,6 +256,21 @@ export default function Dashboard({ user, onLogout }) {
               <p className="text-xs text-muted-foreground mt-1">Active categories</p>
             </CardContent>
           </Card>
+
+          <Card className="shadow-sm hover:shadow-md transition-all duration-300 rounded-xl border-border hover-lift">
+            <CardHeader className="flex flex-row items-center justify-between pb-2">
+              <CardTitle className="text-sm font-medium text-muted-foreground">Projected This Month</CardTitle>
+              <TrendingUp className="h-4 w-4 text-muted-foreground" />
+            </CardHeader>
+            <CardContent>
+              <div className="text-3xl font-bold" data-testid="projected-month-total" style={{ fontFamily: 'Manrope, sans-serif' }}>
+                ₹{forecast?.projected_total.toFixed(2) || '0.00'}
+              </div>
+              <p className="text-xs text-muted-foreground mt-1">
+                ₹{forecast?.spent_to_date.toFixed(2) || '0.00'} spent so far
+              </p>
+            </CardContent>
+          </Card>
         </div>
 
         {/* CSV Download Section */}
@@ -327,6 +344,29 @@ export default function Dashboard({ user, onLogout }) {
           </Card>
         </div>
 
+        {budgets.length > 0 && (
+          <Card className="shadow-sm rounded-xl border-border mb-8">
+            <CardHeader>
+              <CardTitle style={{ fontFamily: 'Manrope, sans-serif' }}>Budgets This Month</CardTitle>
+            </CardHeader>
+            <CardContent>
+              <div className="space-y-4">
+                {budgets.map((budget) => (
+                  <div key={budget.category} data-testid="budget-status-item" className="space-y-2">
+                    <div className="flex items-center justify-between text-sm">
+                      <span className="font-medium">{budget.category}</span>
+                      <span className={budget.remaining < 0 ? 'text-destructive' : 'text-muted-foreground'}>
+                        ₹{budget.spent.toFixed(2)} of ₹{budget.monthly_limit.toFixed(2)}
+                      </span>
+                    </div>
+                    <Progress value={Math.min(100, (budget.spent / budget.monthly_limit) * 100)} />
+                  </div>
+                ))}
+              </div>
+            </CardContent>
+          </Card>
+        )}
+
         <Card className="shadow-sm rounded-xl border-border">
           <CardHeader>
             <CardTitle style={{ fontFamily: 'Manrope, sans-serif' }}>Recent Expenses</CardTitle>
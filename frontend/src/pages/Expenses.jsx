@@ -11,6 +11,7 @@ import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, D
 import { AlertDialog, AlertDialogAction, AlertDialogCancel, AlertDialogContent, AlertDialogDescription, AlertDialogFooter, AlertDialogHeader, AlertDialogTitle } from '@/components/ui/alert-dialog';
 import { Wallet, ArrowLeft, Pencil, Trash2, Filter } from 'lucide-react';
 import DownloadCSV from '../components/DownloadCSV';
+import { syncExpenses } from '../lib/expenseSync';
 
 const CATEGORIES = [
   'All',
@@ -43,9 +44,9 @@ export default function Expenses({ user, onLogout }) {
 
   const fetchExpenses = async () => {
     try {
-      const response = await api.get('/expenses');
-      setExpenses(response.data);
-      setFilteredExpenses(response.data);
+      const synced = await syncExpenses();
+      setExpenses(synced);
+      setFilteredExpenses(synced);
     } catch (error) {
       toast.error('Failed to fetch expenses');
     } finally {
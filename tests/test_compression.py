@@ -0,0 +1,117 @@
+"""
+Unit tests for the compression middleware, run against small ASGI apps
+instead of the API so they need no database.
+"""
+import asyncio
+import gzip
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import compression  # noqa: E402
+from compression import CompressionMiddleware, choose_encoding  # noqa: E402
+
+MINIMUM_SIZE = 1024
+
+
+def streaming_app(chunks, content_type=b"text/csv"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+    return app
+
+
+def single_body_app(body, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def call(app, accept_encoding="gzip"):
+    """Run one request through the middleware; returns (headers, body messages)."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=MINIMUM_SIZE)(scope, receive, send))
+    headers = {name.decode().lower(): value.decode() for name, value in messages[0]["headers"]}
+    return headers, messages[1:]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.1, gzip;q=1", "gzip"),
+    ("br;q=1, gzip;q=0.5", "br"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", "br"),
+    ("*;q=0.5, gzip;q=0.8", "gzip"),
+    ("", None),
+])
+def test_choose_encoding_uses_q_values(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding(header) == expected
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br;q=1, gzip;q=0.5") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def test_streaming_response_is_compressed_chunk_by_chunk():
+    chunks = [b"id,date,amount\n" + b"row,2024-01-01,1.0\n" * 20 for _ in range(5)]
+    headers, bodies = call(streaming_app(chunks))
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    # Every chunk is flushed on its own, not buffered until the end
+    assert len(bodies) == len(chunks)
+    assert all(body["body"] for body in bodies)
+    assert [body["more_body"] for body in bodies] == [True] * 4 + [False]
+    assert gzip.decompress(b"".join(body["body"] for body in bodies)) == b"".join(chunks)
+
+
+def test_large_body_is_compressed_with_length():
+    body = b'{"rows": [' + b'{"amount": 1.0},' * 200 + b'{}]}'
+    assert len(body) > MINIMUM_SIZE
+    headers, bodies = call(single_body_app(body))
+    assert headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in headers["vary"].lower()
+    assert int(headers["content-length"]) == len(bodies[0]["body"])
+    assert gzip.decompress(bodies[0]["body"]) == body
+
+
+def test_small_body_is_sent_as_is():
+    body = b'{"rows": []}'
+    headers, bodies = call(single_body_app(body))
+    assert "content-encoding" not in headers
+    assert bodies[0]["body"] == body
+
+
+def test_binary_content_is_sent_as_is():
+    body = b"\x89PNG" + bytes(range(256)) * 8
+    headers, bodies = call(single_body_app(body, content_type=b"image/png"))
+    assert "content-encoding" not in headers
+    assert bodies[0]["body"] == body
+
+
+def test_client_without_gzip_gets_identity():
+    body = b"x" * (MINIMUM_SIZE * 2)
+    headers, bodies = call(single_body_app(body, content_type=b"text/plain"), accept_encoding="identity")
+    assert "content-encoding" not in headers
+    assert bodies[0]["body"] == body
@@ -0,0 +1,166 @@
+"""
+Unit tests for the group-commit writer, run against an in-memory store so
+they need no database. Version leases are replaced by a per-user counter.
+"""
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import ingest  # noqa: E402
+from ingest import GroupCommitWriter  # noqa: E402
+
+
+class FakeStore:
+    def __init__(self, gate: asyncio.Event = None):
+        self.gate = gate
+        self.rows = []
+        self.batches = []
+
+    async def insert_many(self, expenses):
+        self.batches.append([expense["id"] for expense in expenses])
+        if self.gate is not None:
+            await self.gate.wait()
+        failed = [index for index, expense in enumerate(expenses) if expense.get("reject")]
+        self.rows.extend(expense for index, expense in enumerate(expenses) if index not in failed)
+        if failed:
+            raise BulkWriteError({"writeErrors": [{"index": index, "code": 11000} for index in failed]})
+
+
+@pytest.fixture(autouse=True)
+def versions(monkeypatch):
+    """Hand out versions from a per-user counter; records the leases taken."""
+    counters, leases = {}, []
+
+    @asynccontextmanager
+    async def reserve_versions(db, user_id, count=1):
+        first = counters.get(user_id, 0) + 1
+        counters[user_id] = first + count - 1
+        leases.append((user_id, count))
+        yield first
+
+    monkeypatch.setattr(ingest, "reserve_versions", reserve_versions)
+    return leases
+
+
+def expense(index: int, user_id: str = "user", **fields) -> dict:
+    return {"id": f"e{index}", "user_id": user_id, "amount": 1.0, "category": "Food", **fields}
+
+
+async def submit_all(writer, expenses):
+    return await asyncio.gather(*(writer.submit(exp) for exp in expenses), return_exceptions=True)
+
+
+def test_rows_are_written_in_batches(versions):
+    store = FakeStore()
+    committed = []
+
+    async def on_commit(expenses):
+        committed.append(len(expenses))
+
+    async def scenario():
+        writer = GroupCommitWriter(store, None, on_commit=on_commit, max_batch=50, max_delay=0.01)
+        expenses = [expense(index, user_id=f"user{index % 2}") for index in range(120)]
+        results = await submit_all(writer, expenses)
+        await writer.close()
+        return writer, expenses, results
+
+    writer, expenses, results = asyncio.run(scenario())
+    assert results == [None] * 120
+    assert [len(batch) for batch in store.batches] == [50, 50, 20]
+    assert committed == [50, 50, 20]
+    # One block of versions per user and batch, handed out in order
+    assert versions == [("user0", 25), ("user1", 25)] * 2 + [("user0", 10), ("user1", 10)]
+    for user_id in ("user0", "user1"):
+        assert [exp["version"] for exp in expenses if exp["user_id"] == user_id] == list(range(1, 61))
+    snapshot = writer.metrics.snapshot()
+    assert snapshot["batches"] == 3
+    assert snapshot["expenses"] == 120
+    assert snapshot["max_batch_size"] == 50
+
+
+def test_submit_blocks_when_buffer_is_full():
+    gate = asyncio.Event()
+    store = FakeStore(gate)
+
+    async def scenario():
+        writer = GroupCommitWriter(store, None, max_batch=5, max_delay=0.001, max_pending=10)
+        tasks = [asyncio.create_task(writer.submit(expense(index))) for index in range(40)]
+        await asyncio.sleep(0.05)
+        # One batch is stuck writing; the buffer holds max_pending rows and
+        # everyone else waits to enqueue
+        stalled = (writer.pending, len(store.batches), sum(task.done() for task in tasks))
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        await writer.close()
+        return stalled, results
+
+    stalled, results = asyncio.run(scenario())
+    assert stalled == (10, 1, 0)
+    assert results == [None] * 40
+    assert len(store.rows) == 40
+
+
+def test_only_rows_in_write_errors_fail():
+    store = FakeStore()
+    committed = []
+
+    async def on_commit(expenses):
+        committed.extend(exp["id"] for exp in expenses)
+
+    async def scenario():
+        writer = GroupCommitWriter(store, None, on_commit=on_commit, max_batch=10, max_delay=0.01)
+        results = await submit_all(writer, [expense(index, reject=index in (3, 7)) for index in range(10)])
+        await writer.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [index for index, result in enumerate(results) if isinstance(result, BulkWriteError)] == [3, 7]
+    assert all(result is None for index, result in enumerate(results) if index not in (3, 7))
+    # The totals only count rows that were stored
+    assert committed == [f"e{index}" for index in range(10) if index not in (3, 7)]
+
+
+def test_other_errors_fail_the_whole_batch():
+    class BrokenStore(FakeStore):
+        async def insert_many(self, expenses):
+            raise ConnectionError("connection reset")
+
+    committed = []
+
+    async def on_commit(expenses):
+        committed.extend(expenses)
+
+    async def scenario():
+        writer = GroupCommitWriter(BrokenStore(), None, on_commit=on_commit, max_batch=10, max_delay=0.01)
+        results = await submit_all(writer, [expense(index) for index in range(4)])
+        await writer.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert committed == []
+
+
+def test_close_writes_everything_buffered():
+    store = FakeStore()
+
+    async def scenario():
+        # Long enough that nothing is flushed before close() is called
+        writer = GroupCommitWriter(store, None, max_batch=100, max_delay=60, max_pending=5)
+        tasks = [asyncio.create_task(writer.submit(expense(index))) for index in range(12)]
+        await asyncio.sleep(0.01)
+        await writer.close()
+        results = await asyncio.gather(*tasks)
+        with pytest.raises(RuntimeError):
+            await writer.submit(expense(99))
+        return results
+
+    results = asyncio.run(scenario())
+    assert results == [None] * 12
+    assert sorted(exp["id"] for exp in store.rows) == sorted(f"e{index}" for index in range(12))
@@ -0,0 +1,332 @@
+"""
+Query-plan regression tests.
+
+Every API route is called against a seeded scratch database while a pymongo
+command listener records the queries it issues. Each recorded read or write
+query is then run through `explain` and the test fails when its winning plan
+
+- scans a whole collection (COLLSCAN),
+- sorts in memory (a SORT stage, or a $sort left in an aggregation
+  pipeline), or
+- examines more than MAX_EXAMINED_RATIO documents per document it returns.
+
+Needs a local mongod and is skipped without one. Scratch databases are
+dropped before and after each run.
+
+    PLAN_TEST_MONGO_URL=mongodb://localhost:27017 pytest tests/test_query_plans.py
+
+PLAN_TEST_EXPENSES sets the size of the seeded history of the user the
+routes run as; the other users get a smaller history each.
+"""
+import os
+import random
+import sys
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+MONGO_URL = os.environ.get("PLAN_TEST_MONGO_URL", "mongodb://localhost:27017")
+MAX_EXAMINED_RATIO = float(os.environ.get("PLAN_TEST_MAX_RATIO", 10))
+TARGET_EXPENSES = int(os.environ.get("PLAN_TEST_EXPENSES", 20000))
+OTHER_USERS = int(os.environ.get("PLAN_TEST_OTHER_USERS", 100))
+OTHER_USER_EXPENSES = int(os.environ.get("PLAN_TEST_OTHER_USER_EXPENSES", 200))
+HISTORY_YEARS = 3
+PASSWORD = "plan-test-password"
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Session and cluster bookkeeping that explain does not accept
+UNEXPLAINABLE_FIELDS = {"lsid", "txnNumber", "writeConcern", "readConcern", "apiVersion", "apiStrict"}
+
+# The explain client must exist before the listener is registered, so its
+# own commands are not recorded
+explain_client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+try:
+    explain_client.admin.command("ping")
+except PyMongoError:
+    pytest.skip(f"no mongod reachable at {MONGO_URL}", allow_module_level=True)
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = None
+
+    def started(self, event):
+        if self.commands is not None and event.command_name in EXPLAINABLE_COMMANDS:
+            self.commands.append((event.database_name, event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+recorder = CommandRecorder()
+monitoring.register(recorder)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+from seed_data import CATEGORY_PROFILES, generate_expenses  # noqa: E402
+
+CATEGORIES = [name for name, _, _, _ in CATEGORY_PROFILES]
+
+
+def explain(database: str, command_name: str, command: dict) -> list:
+    """Explain a recorded command, one statement at a time for bulk writes."""
+    body = {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in UNEXPLAINABLE_FIELDS
+    }
+    statements = [body]
+    if command_name in ("update", "delete"):
+        key = "updates" if command_name == "update" else "deletes"
+        statements = [{**body, key: [statement]} for statement in body[key]]
+    return [
+        explain_client[database].command({"explain": statement, "verbosity": "executionStats"})
+        for statement in statements
+    ]
+
+
+def plan_stages(node, in_plan: bool = False) -> set:
+    """Stage names of the winning plan, ignoring rejected plans."""
+    stages = set()
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "stage" and in_plan:
+                stages.add(value)
+            elif key != "rejectedPlans":
+                stages |= plan_stages(value, in_plan or key in ("winningPlan", "executionStages"))
+    elif isinstance(node, list):
+        for value in node:
+            stages |= plan_stages(value, in_plan)
+    return stages
+
+
+def pipeline_sorts(node) -> bool:
+    """Whether a $sort survived outside the query layer (including inside $facet)."""
+    if isinstance(node, dict):
+        return any(key == "$sort" or (key != "$cursor" and pipeline_sorts(value)) for key, value in node.items())
+    if isinstance(node, list):
+        return any(pipeline_sorts(value) for value in node)
+    return False
+
+
+def execution_totals(node):
+    """(docs examined, docs returned) summed over every executionStats section."""
+    examined = returned = 0
+    if isinstance(node, dict):
+        stats = node.get("executionStats")
+        if isinstance(stats, dict):
+            examined += stats.get("totalDocsExamined", 0)
+            stages = stats.get("executionStages", {})
+            # Write explains report matched documents rather than returned ones
+            returned += stats.get("nReturned", 0) or stages.get("nMatched", 0) or stages.get("nWouldDelete", 0)
+        for key, value in node.items():
+            if key != "executionStats":
+                sub_examined, sub_returned = execution_totals(value)
+                examined += sub_examined
+                returned += sub_returned
+    elif isinstance(node, list):
+        for value in node:
+            sub_examined, sub_returned = execution_totals(value)
+            examined += sub_examined
+            returned += sub_returned
+    return examined, returned
+
+
+def plan_problems(command_name: str, command: dict, plan: dict) -> list:
+    problems = []
+    stages = plan_stages(plan)
+    if "COLLSCAN" in stages:
+        problems.append("collection scan")
+    if "SORT" in stages or pipeline_sorts(plan.get("stages", [])):
+        problems.append("in-memory sort")
+
+    # Grouping returns fewer documents than it reads by design, and
+    # distinct/count return values rather than documents
+    grouped = command_name == "aggregate" and any("$group" in stage for stage in command.get("pipeline", []))
+    if not grouped and command_name not in ("distinct", "count"):
+        examined, returned = execution_totals(plan)
+        if examined > MAX_EXAMINED_RATIO * max(returned, 1):
+            problems.append(f"examined {examined} documents to return {returned}")
+    return problems
+
+
+async def seed_expenses(app, user_ids: list, counts: list):
+    resources = app.state.resources
+    store, categories = resources.expense_store, resources.categories
+    rng = random.Random(1234)
+    last_day = date.today()
+    first_day = last_day - timedelta(days=365 * HISTORY_YEARS)
+    for user_id, count in zip(user_ids, counts):
+        # Fresh users get ids in this order, matching the generator's category_id
+        for name in CATEGORIES:
+            await categories.resolve(user_id, name)
+        rows = generate_expenses(rng, user_id, count, first_day, last_day)
+        for offset in range(0, len(rows), 5000):
+            await store.insert_many(rows[offset:offset + 5000])
+        await resources.db.sync_counters.update_one({"user_id": user_id}, {"$set": {"seq": count}}, upsert=True)
+        await categories.set_totals(user_id, {
+            index + 1: (sum(exp["amount"] for exp in rows if exp["category_id"] == index + 1),
+                        sum(1 for exp in rows if exp["category_id"] == index + 1))
+            for index in range(len(CATEGORIES))
+        })
+
+
+async def archive_history(app, user_id: str) -> str:
+    """Archive the oldest year of the user's history; returns the cutoff."""
+    cutoff = f"{date.today().year - HISTORY_YEARS + 1}-01-01"
+    await app.state.resources.expense_store.archive_user(user_id, cutoff)
+    return cutoff
+
+
+class PlanEnvironment:
+    def __init__(self, client: TestClient, layout: str):
+        self.client = client
+        self.layout = layout
+        self.headers = {}
+        self.ids = {}
+
+
+@pytest.fixture(scope="module", params=["flat", "bucketed"])
+def plan_env(request):
+    layout = request.param
+    db_name = f"query_plan_test_{layout}"
+    explain_client.drop_database(db_name)
+    app = server.create_app(server.Settings(mongo_url=MONGO_URL, db_name=db_name, expense_storage=layout))
+
+    with TestClient(app) as client:
+        env = PlanEnvironment(client, layout)
+        email = f"plans-{uuid.uuid4().hex[:8]}@example.com"
+        response = client.post("/api/auth/register", json={"name": "Plans", "email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        user_id = response.json()["user"]["id"]
+        env.email = email
+        env.headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        others = [str(uuid.uuid4()) for _ in range(OTHER_USERS)]
+        explain_client[db_name].users.insert_many([
+            {"id": other, "name": "Other", "email": f"{other}@example.com", "password_hash": "", "created_at": ""}
+            for other in others
+        ])
+        client.portal.call(
+            seed_expenses, app, [user_id] + others, [TARGET_EXPENSES] + [OTHER_USER_EXPENSES] * OTHER_USERS
+        )
+        cutoff = client.portal.call(archive_history, app, user_id)
+
+        today = date.today()
+        for n in range(5):
+            response = client.post("/api/recurring", headers=env.headers, json={
+                "amount": 10 + n, "category": CATEGORIES[n], "description": f"Subscription {n}",
+                "frequency": "monthly", "start_date": (today - timedelta(days=400)).isoformat()
+            })
+            assert response.status_code == 201, response.text
+            env.ids.setdefault("rules", []).append(response.json()["id"])
+        for name in CATEGORIES[:4]:
+            client.post("/api/budget", headers=env.headers, json={
+                "category": name, "monthly_limit": 500, "month": today.month, "year": today.year
+            })
+
+        live = client.get("/api/expenses", headers=env.headers).json()
+        stored = [exp for exp in live if not exp.get("recurring_id")]
+        env.ids["live"] = [exp["id"] for exp in stored[:10]]
+        env.ids["occurrences"] = [exp["id"] for exp in live if exp.get("recurring_id")][:5]
+        archived = client.portal.call(
+            app.state.resources.expense_store.find, user_id, None, None, cutoff, True, True, 5
+        )
+        env.ids["archived"] = [exp["id"] for exp in archived]
+        env.sync_token = client.get("/api/expenses/changes", headers=env.headers).json()["token"]
+        client.post("/api/expenses", headers=env.headers, json={
+            "amount": 12.5, "category": "Food", "description": "After sync", "date": today.isoformat()
+        })
+        yield env
+
+    explain_client.drop_database(db_name)
+
+
+def expense_body(category: str = "Food") -> dict:
+    return {"amount": 42.0, "category": category, "description": "Plan test", "date": date.today().isoformat()}
+
+
+def month_window() -> tuple:
+    today = date.today()
+    return (today - timedelta(days=90)).isoformat(), today.isoformat()
+
+
+# Route name -> (method, path, JSON body) built from the seeded environment
+ROUTES = {
+    "register": lambda env: ("POST", "/api/auth/register", {
+        "name": "New", "email": f"new-{uuid.uuid4().hex[:8]}@example.com", "password": PASSWORD
+    }),
+    "login": lambda env: ("POST", "/api/auth/login", {"email": env.email, "password": PASSWORD}),
+    "create_expense": lambda env: ("POST", "/api/expenses", expense_body()),
+    "create_expense_new_category": lambda env: ("POST", "/api/expenses", expense_body(f"New {uuid.uuid4().hex[:6]}")),
+    "list_expenses": lambda env: ("GET", "/api/expenses", None),
+    "list_expenses_by_category": lambda env: ("GET", "/api/expenses?category=food", None),
+    "list_expenses_by_range": lambda env: (
+        "GET", "/api/expenses?start_date={}&end_date={}".format(*month_window()), None
+    ),
+    "list_expenses_full_history_range": lambda env: (
+        "GET", f"/api/expenses?start_date=2000-01-01&end_date={date.today().isoformat()}", None
+    ),
+    "expense_changes_full": lambda env: ("GET", "/api/expenses/changes", None),
+    "expense_changes_delta": lambda env: ("GET", f"/api/expenses/changes?since={env.sync_token}", None),
+    "get_expense": lambda env: ("GET", f"/api/expenses/{env.ids['live'][0]}", None),
+    "get_archived_expense": lambda env: ("GET", f"/api/expenses/{env.ids['archived'][0]}", None),
+    "get_occurrence": lambda env: ("GET", f"/api/expenses/{env.ids['occurrences'][0]}", None),
+    "update_expense": lambda env: ("PUT", f"/api/expenses/{env.ids['live'][1]}", expense_body("Transport")),
+    "update_archived_expense": lambda env: ("PUT", f"/api/expenses/{env.ids['archived'][1]}", expense_body()),
+    "update_occurrence": lambda env: ("PUT", f"/api/expenses/{env.ids['occurrences'][1]}", expense_body()),
+    "delete_expense": lambda env: ("DELETE", f"/api/expenses/{env.ids['live'][2]}", None),
+    "delete_archived_expense": lambda env: ("DELETE", f"/api/expenses/{env.ids['archived'][2]}", None),
+    "delete_occurrence": lambda env: ("DELETE", f"/api/expenses/{env.ids['occurrences'][2]}", None),
+    "export_csv": lambda env: (
+        "GET", f"/api/expenses/export/csv?month={date.today().month}&year={date.today().year}", None
+    ),
+    "create_recurring": lambda env: ("POST", "/api/recurring", {
+        "amount": 9.99, "category": "Bills", "description": "Plan test rule",
+        "frequency": "weekly", "start_date": date.today().isoformat()
+    }),
+    "list_recurring": lambda env: ("GET", "/api/recurring", None),
+    "delete_recurring": lambda env: ("DELETE", f"/api/recurring/{env.ids['rules'][-1]}", None),
+    "analytics_summary": lambda env: ("GET", "/api/analytics/summary", None),
+    "analytics_summary_range": lambda env: (
+        "GET", "/api/analytics/summary?start_date={}&end_date={}".format(*month_window()), None
+    ),
+    "forecast": lambda env: ("GET", "/api/analytics/forecast", None),
+    "create_budget": lambda env: ("POST", "/api/budget", {
+        "category": "Health", "monthly_limit": 100, "month": date.today().month, "year": date.today().year
+    }),
+    "update_budget": lambda env: ("POST", "/api/budget", {
+        "category": "food", "monthly_limit": 750, "month": date.today().month, "year": date.today().year
+    }),
+    "list_budgets": lambda env: ("GET", "/api/budget", None),
+    "dashboard": lambda env: ("GET", "/api/dashboard", None),
+    "categories": lambda env: ("GET", "/api/categories", None),
+}
+
+
+@pytest.mark.parametrize("route", list(ROUTES))
+def test_route_query_plans(plan_env, route):
+    method, path, body = ROUTES[route](plan_env)
+    recorder.commands = []
+    try:
+        response = plan_env.client.request(method, path, json=body, headers=plan_env.headers)
+    finally:
+        commands, recorder.commands = recorder.commands, None
+    assert response.status_code < 300, f"{method} {path}: {response.status_code} {response.text}"
+
+    failures = []
+    for database, command_name, command in commands:
+        for plan in explain(database, command_name, command):
+            for problem in plan_problems(command_name, command, plan):
+                collection = command.get(command_name)
+                failures.append(f"{command_name} on {collection}: {problem}\n    {command}")
+    assert not failures, f"{plan_env.layout} {method} {path}:\n" + "\n".join(failures)
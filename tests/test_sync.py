@@ -0,0 +1,138 @@
+"""
+Delta sync tests.
+
+Versions are allocated before the write that uses them commits, so two
+concurrent writes can commit in the opposite order of their versions. These
+tests interleave writes that way and check that the sync token never moves
+past a write that has not landed yet.
+
+Needs a local mongod and is skipped without one. The scratch database is
+dropped before and after the run.
+
+    SYNC_TEST_MONGO_URL=mongodb://localhost:27017 pytest tests/test_sync.py
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+MONGO_URL = os.environ.get("SYNC_TEST_MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = "sync_test"
+
+admin_client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+try:
+    admin_client.admin.command("ping")
+except PyMongoError:
+    pytest.skip(f"no mongod reachable at {MONGO_URL}", allow_module_level=True)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+from sync import VERSION_LEASE_SECONDS, reserve_versions  # noqa: E402
+
+
+def expense(user_id: str, version: int) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "amount": 10.0,
+        "category": "Food",
+        "description": f"version {version}",
+        "date": date.today().isoformat(),
+        "created_at": now,
+        "updated_at": now,
+        "version": version
+    }
+
+
+async def sync(resources, user_id: str, token: str = None):
+    return await server.get_expense_changes(
+        user_id=user_id, since=token, db=resources.db, store=resources.expense_store
+    )
+
+
+@pytest.fixture(scope="module", params=["flat", "bucketed"])
+def resources(request):
+    db_name = f"{DB_NAME}_{request.param}"
+    admin_client.drop_database(db_name)
+    app = server.create_app(server.Settings(mongo_url=MONGO_URL, db_name=db_name, expense_storage=request.param))
+    with TestClient(app) as client:
+        yield client.portal, app.state.resources
+    admin_client.drop_database(db_name)
+
+
+def test_late_commit_is_sent_by_next_sync(resources):
+    portal, res = resources
+    user_id = str(uuid.uuid4())
+
+    async def scenario():
+        slow = expense(user_id, 0)
+        fast = None
+        async with reserve_versions(res.db, user_id) as slow_version:
+            slow["version"] = slow_version
+            async with reserve_versions(res.db, user_id) as fast_version:
+                fast = expense(user_id, fast_version)
+                await res.expense_store.insert(fast)
+            # The higher version is visible while the lower one is in flight
+            first = await sync(res, user_id)
+            await res.expense_store.insert(slow)
+        second = await sync(res, user_id, first.token)
+        return slow, fast, first, second
+
+    slow, fast, first, second = portal.call(scenario)
+    assert slow["version"] < fast["version"]
+    assert [exp.id for exp in first.changes] == [fast["id"]]
+    assert server.decode_sync_token(first.token)[0] < slow["version"]
+    assert slow["id"] in {exp.id for exp in second.changes}
+    assert server.decode_sync_token(second.token)[0] == fast["version"]
+
+
+def test_token_advances_once_writes_commit(resources):
+    portal, res = resources
+    user_id = str(uuid.uuid4())
+
+    async def scenario():
+        versions = []
+        for _ in range(3):
+            async with reserve_versions(res.db, user_id) as version:
+                await res.expense_store.insert(expense(user_id, version))
+                versions.append(version)
+        first = await sync(res, user_id)
+        second = await sync(res, user_id, first.token)
+        return versions, first, second
+
+    versions, first, second = portal.call(scenario)
+    assert server.decode_sync_token(first.token)[0] == versions[-1]
+    assert len(first.changes) == 3
+    assert second.changes == []
+
+
+def test_expired_lease_does_not_hold_back_token(resources):
+    portal, res = resources
+    user_id = str(uuid.uuid4())
+
+    async def scenario():
+        # A writer that died after drawing its version never releases it
+        await res.db.sync_counters.insert_one({
+            "user_id": user_id,
+            "seq": 1,
+            "leases": {"dead": {"at": time.time() - VERSION_LEASE_SECONDS - 1, "floor": 1}}
+        })
+        async with reserve_versions(res.db, user_id) as version:
+            await res.expense_store.insert(expense(user_id, version))
+        changes = await sync(res, user_id)
+        counter = await res.db.sync_counters.find_one({"user_id": user_id})
+        return version, changes, counter
+
+    version, changes, counter = portal.call(scenario)
+    assert server.decode_sync_token(changes.token)[0] == version
+    assert counter["leases"] == {}